@@ -15,25 +15,212 @@ __license__ = "UNLICENSED/NOLICENSE - Private"
 __status__ = "Development"
 __version__ = "0.0.1"
 
-import csv
 import gzip
-import ipaddress
+import io
+import mmap
 import os
+import queue
+import shutil
+import socket
+import struct
 import uuid
-from random import randint, randrange
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context
 from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
     Dict,
     List,
     Optional,
-    TextIO,
     Tuple,
     TypedDict,
 )
 from urllib.request import Request, urlopen
 
-from rich.progress import (
-    Progress,
-)
+import numpy as np
+import pandas as pd
+from numba import njit, prange, set_num_threads
+from numpy.lib.recfunctions import structured_to_unstructured
+
+if TYPE_CHECKING:
+    from rich.progress import Progress
+
+# HD record layout, the 6 byte timestamp is packed as a 2 byte high and a 4 byte low part
+_FLOW_STRUCT = struct.Struct(">HI16sIIIIIHHBBBHHIIHH")
+_IPV4_STRUCT = struct.Struct(">I")
+
+# In memory flow record, the fields are in CSV column order less the system ID
+FLOW_DTYPE = np.dtype([
+    ("timestamp", np.uint64),
+    ("srcaddr", np.uint32),
+    ("dstaddr", np.uint32),
+    ("nexthop", np.uint32),
+    ("dPkts", np.uint32),
+    ("dOctets", np.uint32),
+    ("first", np.uint64),
+    ("last", np.uint64),
+    ("srcport", np.uint16),
+    ("dstport", np.uint16),
+    ("tcp_flags", np.uint8),
+    ("protocol", np.uint8),
+    ("tos", np.uint8),
+    ("src_as", np.uint16),
+    ("dst_as", np.uint16),
+    ("src_mask", np.uint32),
+    ("dst_mask", np.uint32),
+    ("input", np.uint16),
+    ("output", np.uint16),
+])
+
+# Rows of the per connection draws made by `_draw_connections`
+_DRAW_ROUTE, _DRAW_CLIENT_IP, _DRAW_SERVER_IP, _DRAW_CLIENT_BYTES, _DRAW_SERVER_BYTES = range(5)
+_DRAW_CLIENT_PORT, _DRAW_SERVER_PORT, _DRAW_CLIENT_START, _DRAW_SERVER_START = range(5, 9)
+_DRAW_ROWS: int = 9
+
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _draw_connections(
+    seeds,
+    chunk,
+    time_index,
+    route_ip_start,
+    route_ip_end,
+    server_list,
+    server_ports,
+    heavy_bytes,
+    light_bytes,
+    server_as_source_weight,
+    ephemeral_ports,
+    out,
+):
+    """Draw the random fields of a batch of bidirectional connections.
+
+    The batch is split into chunks of `chunk` connections that run in
+    parallel, each seeded from `seeds` so the draws do not depend on the
+    number of threads.
+
+    Args:
+        seeds (np.ndarray): One seed per chunk
+        chunk (int): Connections per chunk
+        time_index (np.ndarray): The time index for each client flow
+        route_ip_start (np.ndarray): First usable address of each route
+        route_ip_end (np.ndarray): Last usable address of each route, exclusive
+        server_list (np.ndarray): The server addresses
+        server_ports (np.ndarray): The server ports
+        heavy_bytes (Tuple[int, int]): Inclusive range of the heavy side transfer size
+        light_bytes (Tuple[int, int]): Inclusive range of the light side transfer size
+        server_as_source_weight (int): Percent of connections that are heavy server to client
+        ephemeral_ports (Tuple[int, int]): Inclusive range of the client ports
+        out (np.ndarray): (`_DRAW_ROWS`, connections) int64 array the draws are written to
+    """
+    n = time_index.shape[0]
+    for c in prange(seeds.shape[0]):
+        np.random.seed(seeds[c])
+        for i in range(c * chunk, min((c + 1) * chunk, n)):
+            # Generate Client and server
+            route = np.random.randint(0, route_ip_start.shape[0])
+            out[_DRAW_ROUTE, i] = route
+            out[_DRAW_CLIENT_IP, i] = np.random.randint(route_ip_start[route], route_ip_end[route])
+            out[_DRAW_SERVER_IP, i] = server_list[np.random.randint(0, server_list.shape[0])]
+            # Randomly Select Transfer Sizes and the heavy side
+            heavy = np.random.randint(heavy_bytes[0], heavy_bytes[1] + 1)
+            light = np.random.randint(light_bytes[0], light_bytes[1] + 1)
+            if np.random.randint(0, 100) > server_as_source_weight:
+                out[_DRAW_CLIENT_BYTES, i] = heavy
+                out[_DRAW_SERVER_BYTES, i] = light
+            else:
+                out[_DRAW_CLIENT_BYTES, i] = light
+                out[_DRAW_SERVER_BYTES, i] = heavy
+            # L4 Port
+            out[_DRAW_CLIENT_PORT, i] = np.random.randint(ephemeral_ports[0], ephemeral_ports[1] + 1)
+            out[_DRAW_SERVER_PORT, i] = server_ports[np.random.randint(0, server_ports.shape[0])]
+            # Flow start time in milliseconds
+            out[_DRAW_CLIENT_START, i] = time_index[i] - np.random.randint(1, 60001)
+            out[_DRAW_SERVER_START, i] = time_index[i] - np.random.randint(1, 60001)
+
+# Longest CSV text of a flow's columns, each is at most twenty digits and a separator
+_CSV_FLOWS_MAX_BYTES: int = len(FLOW_DTYPE.names) * 21
+
+
+@njit(cache=True, boundscheck=False)
+def _format_csv_batch(values, system_id, system_id_col, sampled_index, raw_out, sampled_out):
+    """Format a batch of flows as CSV lines and copy the sampled lines in the same pass.
+
+    Args:
+        values (np.ndarray): (rows, columns) uint64 flow fields in `FLOW_DTYPE` order
+        system_id (np.ndarray): The system ID as uint8 ASCII
+        system_id_col (int): The CSV column the system ID is written at
+        sampled_index (np.ndarray): Row numbers of the sampled flows
+        raw_out (np.ndarray): uint8 buffer the raw CSV lines are written to
+        sampled_out (np.ndarray): uint8 buffer the sampled CSV lines are written to
+
+    Returns:
+        Tuple[int, int]: Bytes written to raw_out, Bytes written to sampled_out
+    """
+    rows, columns = values.shape
+    ten = np.uint64(10)
+    digits = np.empty(20, dtype=np.uint8)
+    row_start = np.empty(rows + 1, dtype=np.int64)
+    pos = 0
+    for r in range(rows):
+        row_start[r] = pos
+        for c in range(columns):
+            if c == system_id_col:
+                for b in system_id:
+                    raw_out[pos] = b
+                    pos += 1
+                raw_out[pos] = 44  # ,
+                pos += 1
+            v = values[r, c]
+            n = 0
+            while True:
+                digits[n] = 48 + v % ten
+                v //= ten
+                n += 1
+                if v == 0:
+                    break
+            while n > 0:
+                n -= 1
+                raw_out[pos] = digits[n]
+                pos += 1
+            raw_out[pos] = 44 if c < columns - 1 else 10  # , or \n
+            pos += 1
+    row_start[rows] = pos
+    # The sampled lines are byte copies of lines already formatted above
+    sampled_pos = 0
+    for i in sampled_index:
+        for p in range(row_start[i], row_start[i + 1]):
+            sampled_out[sampled_pos] = raw_out[p]
+            sampled_pos += 1
+    return pos, sampled_pos
+
+def read_flows(path: str, columns: List[str]) -> pd.DataFrame:
+    """Load a binary flow file written with `binary=True` into a DataFrame.
+
+    The file is a headerless run of `FLOW_DTYPE` records in native byte order.
+
+    Args:
+        path (str): Path to the `.bin` flow file
+        columns (List[str]): The `FLOW_DTYPE` fields to load
+
+    Returns:
+        pd.DataFrame: One column per requested field
+    """
+    flows: np.ndarray = np.fromfile(path, dtype=FLOW_DTYPE)
+    # Contiguous copies at the record's own widths, the same dtypes a CSV load is given
+    return pd.DataFrame({column: np.ascontiguousarray(flows[column]) for column in columns})
+
+def ip_to_int(ip: str) -> int:
+    """Convert a dotted quad IPv4 Address to an int.
+
+    Args:
+        ip (str): The IP Address
+
+    Returns:
+        int: The IP Address as int
+    """
+    return _IPV4_STRUCT.unpack(socket.inet_pton(socket.AF_INET, ip))[0]
 
 class FlowRecord(TypedDict):
     """A Typping object for a Flow Record."""
@@ -73,6 +260,17 @@ class ASNRoute(TypedDict, total=False):
     as_description: str
     ifindex: int
 
+class RouteTable(TypedDict):
+    """A Typing object for the route table, one array per field with a row per route."""
+
+    next_hop: np.ndarray
+    subnet_bits: np.ndarray
+    asn: np.ndarray
+    ifindex: np.ndarray
+    ip_range_start: np.ndarray
+    ip_range_end: np.ndarray
+
+
 class NetworkInterface(TypedDict, total=False):
     """A Typing object for a Route's Network Interfaces."""
 
@@ -81,29 +279,51 @@ class NetworkInterface(TypedDict, total=False):
     next_hop_b: bytes
     next_hop_i: int
 
+def make_interface(ifindex: int, next_hop: str) -> NetworkInterface:
+    """Create a network interface with its next hop pre converted.
+
+    Args:
+        ifindex (int): The interface index
+        next_hop (str): The next hop IP Address
+
+    Returns:
+        NetworkInterface: The interface with `next_hop_b` and `next_hop_i` filled in
+    """
+    next_hop_b: bytes = socket.inet_pton(socket.AF_INET, next_hop)
+    return {
+        "ifindex": ifindex,
+        "next_hop": next_hop,
+        "next_hop_b": next_hop_b,
+        "next_hop_i": _IPV4_STRUCT.unpack(next_hop_b)[0],
+    }
+
 class DataGeneration:
     """Produce flow random based on NetFlow v5."""
 
     RECORD_LEN = 75
     DEFAULT_PEERING_INTERFACES: List[NetworkInterface] = [
-        {"ifindex": 10, "next_hop": "10.0.10.2"},
-        {"ifindex": 11, "next_hop": "10.0.20.2"},
-        {"ifindex": 12, "next_hop": "10.0.30.2"},
-        {"ifindex": 13, "next_hop": "10.0.40.2"},
-        {"ifindex": 14, "next_hop": "10.0.0.2"},
+        make_interface(ifindex=10, next_hop="10.0.10.2"),
+        make_interface(ifindex=11, next_hop="10.0.20.2"),
+        make_interface(ifindex=12, next_hop="10.0.30.2"),
+        make_interface(ifindex=13, next_hop="10.0.40.2"),
+        make_interface(ifindex=14, next_hop="10.0.0.2"),
     ]
     EPHEMERAL_PORTS: Tuple[int, int] = (49152, 65535)
     IP2ASN_FILE = "ip2asn-v4-u32.tsv"
     IP2ASN_CLEAN_FILE = "ip2asn-v4-u32-clean.tsv"
     IP2ASN_FILE_URL = "https://iptoasn.com/data/ip2asn-v4-u32.tsv.gz"
+    # Column names and types of the ip2asn TSV, the ASN is 64-bit until the 32-bit ASNs are dropped
+    IP2ASN_COLUMNS: List[str] = ["start", "end", "asn", "cc", "desc"]
+    IP2ASN_DTYPES: Dict[str, object] = {
+        "start": np.int64,
+        "end": np.int64,
+        "asn": np.int64,
+        "cc": "category",
+        "desc": "string",
+    }
     INTERNAL_ASN = 65000
     INTERNAL_SUBNET = 24
-    INTERNAL_IFINDEX: NetworkInterface = {
-        "ifindex": 100,
-        "next_hop": "10.1.1.2",
-        "next_hop_b": b"\n\x01\x01\x02",
-        "next_hop_i": 167837954,
-    }
+    INTERNAL_IFINDEX: NetworkInterface = make_interface(ifindex=100, next_hop="10.1.1.2")
     MAX_JITTER: int = 6
     MAX_LIGHT_PACKET_BYTES: int = 4000000
     MIN_LIGHT_PACKET_BYTES: int = 2000000
@@ -113,13 +333,57 @@ class DataGeneration:
     SERVER_LATENCY: int = 15
     SERVER_PORT: List[int] = [443, 80, 22]
     SERVER_RANGE: Tuple[str, str] = ("10.10.10.10", "10.10.10.100")
+    WRITE_BUFFER_SIZE: int = 1 << 20  # 1 MiB output file buffers
+    BATCH_FLOWS: int = 1_000_000  # Flows generated and written per batch of whole seconds
+    PROGRESS_STEP: int = 100_000  # Flows made between dashboard progress updates
+    DRAW_CHUNK: int = 1 << 16  # Connections per parallel chunk of random draws
+    DECOMPRESS_CHUNK_SIZE: int = 1 << 17  # 128 KiB chunks when unzipping the ASN file
+    SHARD_LEAD_IN_SECONDS: int = 1  # Seconds a shard simulates before its start to bring in the return flows
 
-    route_table: Dict[int, ASNRoute]
-    server_list: List[int]
+    CSV_FIELDS: List[str] = [
+        "timestamp",
+        "system_id",
+        "srcaddr",
+        "dstaddr",
+        "nexthop",
+        "dPkts",
+        "dOctets",
+        "first",
+        "last",
+        "srcport",
+        "dstport",
+        "tcp_flags",
+        "protocol",
+        "tos",
+        "src_as",
+        "dst_as",
+        "src_mask",
+        "dst_mask",
+        "input",
+        "output",
+    ]
+
+    route_table: RouteTable
+    server_list: np.ndarray
+
+    # Column views of the route table used by the batched generator
+    route_next_hop: np.ndarray
+    route_subnet: np.ndarray
+    route_asn: np.ndarray
+    route_ifindex: np.ndarray
+    route_ip_start: np.ndarray
+    route_ip_end: np.ndarray
 
     system_id: str = ""
     
-    def __init__(self, log, out_dir: str, system_id: Optional[bytes] = None):
+    def __init__(
+        self,
+        log,
+        out_dir: str,
+        system_id: Optional[bytes] = None,
+        seed: Optional[int] = None,
+        file_factory: Optional[Callable[[str], BinaryIO]] = None,
+    ):
         """Init flow_gen class instance.
 
         If `system_id` is not given then a random 32 Byte ID is generated.
@@ -127,16 +391,53 @@ class DataGeneration:
             log: Logging function
             out_dir (str): Output directory
             system_id (Optional[bytes]): 32 Byte System ID
+            seed (Optional[int]): Seed for the random generator, random when not set. The flows
+                also depend on the number of workers `generate_data` is given
+            file_factory (Optional[Callable[[str], BinaryIO]]): Opens the output files for
+                writing, must be picklable to be used by worker processes. Defaults to `open_buffered`
         """
         self.log = log
+        self.file_factory: Callable[[str], BinaryIO] = file_factory or open_buffered
         self.first_three = True
         self.out_dir = out_dir
         if system_id:
             self.system_id = system_id.hex()
         else:
             self.system_id = "{:<32}".format(uuid.uuid4().hex)
+        # Padded to the 16 bytes reserved for it in the HD record
+        self._system_id_bytes: bytes = bytes.fromhex(self.system_id).ljust(16, b"\x00")[:16]
+        # PCG64DXSM is as fast as SFC64 here and can be jumped to split streams between shards
+        self.rng = np.random.Generator(np.random.PCG64DXSM(seed))
+        # The system ID is the same for every record so the CSV formatter copies it in as is
+        self._system_id_csv: np.ndarray = np.frombuffer(self.system_id.encode(), dtype=np.uint8)
+        # Longest CSV line, the CSV buffers are sized from it and the formatter does not bounds check
+        self._csv_row_max_bytes: int = _CSV_FLOWS_MAX_BYTES + self._system_id_csv.shape[0] + 1
+        self._csv_raw_buffer: np.ndarray = np.empty(0, dtype=np.uint8)
+        self._csv_sampled_buffer: np.ndarray = np.empty(0, dtype=np.uint8)
+        # Reused by every batch, grown when a batch needs more
+        self._draw_buffer: np.ndarray = np.empty(0, dtype=np.int64)
+        self._server_ports: np.ndarray = np.array(self.SERVER_PORT, dtype=np.int64)
+
+    def _read_asn_tsv(self, path: str) -> pd.DataFrame:
+        """Load an ip2asn TSV into typed columns.
+
+        Args:
+            path (str): Path to the TSV
+
+        Returns:
+            pd.DataFrame: The ASN table with the columns in `IP2ASN_COLUMNS`
+        """
+        # keep_default_na is off so the Namibia country code and "None" stay strings
+        return pd.read_csv(
+            path,
+            sep="\t",
+            header=None,
+            names=self.IP2ASN_COLUMNS,
+            dtype=self.IP2ASN_DTYPES,
+            keep_default_na=False,
+        )
 
-    def get_asns(self) -> List[List[str]]:
+    def get_asns(self) -> pd.DataFrame:
         """Get all non DOD Autonomous System Numbers in the Internet.
 
         This method will load a TSV file of ASNs and scrub them. If the TSV is
@@ -146,18 +447,17 @@ class DataGeneration:
         range_start, range_end, AS_number, country_code, AS_description
 
         Returns:
-            List[List[str]]: A filtered list of ASNs and their metadata
+            pd.DataFrame: A filtered table of ASNs and their metadata
         """
         zip_file_name: str = self.IP2ASN_FILE_URL.rsplit("/", 1)[-1]
-        ip2asn: List[List[str]]
+        ip2asn: pd.DataFrame
         # Test for clean ASN file
         if os.path.isfile(f"{self.out_dir}{self.IP2ASN_CLEAN_FILE}"):
             self.log(
                 f"Loading a cleaned ASN list form {self.IP2ASN_CLEAN_FILE}"
             )
-            with open(f"{self.out_dir}{self.IP2ASN_CLEAN_FILE}", "r") as fd:
-                _reader = csv.reader(fd, delimiter="\t", quotechar='"')
-                ip2asn = list(_reader)
+            ip2asn = self._read_asn_tsv(f"{self.out_dir}{self.IP2ASN_CLEAN_FILE}")
+            ip2asn["asn"] = ip2asn["asn"].astype(np.int32)
             self.log(
                 f"Loaded {len(ip2asn)} ASNs from {self.out_dir}{self.IP2ASN_CLEAN_FILE}"
             )
@@ -186,77 +486,57 @@ class DataGeneration:
                 self.log(
                     f"Decompressing {self.IP2ASN_FILE} from {zip_file_name}"
                 )
-                gz = gzip.GzipFile(f"{self.out_dir}{zip_file_name}", "rb")
-                tsv_file = open(f"{self.out_dir}{self.IP2ASN_FILE}", "wb")
-                tsv_file.write(gz.read())
-                tsv_file.close()
-                gz.close()
+                with gzip.open(f"{self.out_dir}{zip_file_name}", "rb") as gz, open(
+                    f"{self.out_dir}{self.IP2ASN_FILE}", "wb"
+                ) as tsv_file:
+                    shutil.copyfileobj(gz, tsv_file, length=self.DECOMPRESS_CHUNK_SIZE)
             elif not os.path.isfile(f"{self.out_dir}{zip_file_name}") and not os.path.isfile(
                 f"{self.out_dir}{self.IP2ASN_FILE}"
             ):
                 raise ValueError(
                     f"Unable to find compressed ASN file: {zip_file_name}"
                 )
-            elif not os.path.isfile(self.IP2ASN_FILE):
+            elif not os.path.isfile(f"{self.out_dir}{self.IP2ASN_FILE}"):
                 raise ValueError(
                     f"Unable to find ASN file: {self.IP2ASN_FILE}"
                 )
 
             # Load TSV ASN Data
-            with open(f"{self.out_dir}{self.IP2ASN_FILE}", "r") as fd:
-                _reader = csv.reader(fd, delimiter="\t", quotechar='"')
-                ip2asn = list(_reader)
+            ip2asn = self._read_asn_tsv(f"{self.out_dir}{self.IP2ASN_FILE}")
 
             # Clean the ASN data
             self.log(f"Cleaning route data for {len(ip2asn)} routes")
-            dropped: int = 0
             routes_count = len(ip2asn)
-            # Loop backwards to filter the list in place and save on memory utilization.
-            index = routes_count - 1
-            while index > 0:
-                if ip2asn[index][4] == ("Not routed"):
-                    dropped += 1
-                    self.log(f"Dropping ASN {ip2asn[index][2]} - Not routed")
-                    del ip2asn[index]
-                elif ip2asn[index][4] == ("-Reserved AS-"):
-                    dropped += 1
-                    self.log(f"Dropping ASN {ip2asn[index][2]} - Reserved AS")
-                    del ip2asn[index]
-                elif ip2asn[index][4].startswith("DNIC-"):
-                    dropped += 1
-                    self.log(f"Dropping ASN {ip2asn[index][2]} - DNIC AS")
-                    del ip2asn[index]
-                elif int(ip2asn[index][2]) > 65535:
-                    dropped += 1
-                    self.log(f"Dropping ASN {ip2asn[index][2]} - Private AS")
-                    del ip2asn[index]
-                elif int(ip2asn[index][2]) == 0:
-                    dropped += 1
-                    self.log(f"Dropping ASN {ip2asn[index][2]} - AS 0")
-                    del ip2asn[index]
-                elif int(ip2asn[index][1]) < (int(ip2asn[index][0]) + 254):
-                    dropped += 1
-                    self.log(
-                        f"Dropping ASN {ip2asn[index][2]} - Non Routable AS"
-                    )
-                    del ip2asn[index]
-                index -= 1
+            # Drop unrouted, reserved, DNIC, private (32-bit), AS 0 and non routable (smaller then a /24) ranges
+            keep = (
+                ~ip2asn["desc"].isin(["Not routed", "-Reserved AS-"])
+                & ~ip2asn["desc"].str.startswith("DNIC-", na=False)
+                & (ip2asn["asn"] > 0)
+                & (ip2asn["asn"] <= 65535)
+                & (ip2asn["end"] >= ip2asn["start"] + 254)
+            )
+            ip2asn = ip2asn[keep].reset_index(drop=True)
+            ip2asn["asn"] = ip2asn["asn"].astype(np.int32)
+            dropped: int = routes_count - len(ip2asn)
             self.log(
                 f"Filter dropped {dropped} of {routes_count} routes, {routes_count - dropped} routes remaining"
             )
             self.log("Saving Cleaned ASN List")
-            with open(f"{self.out_dir}{self.IP2ASN_CLEAN_FILE}", "w") as fd:
-                write = csv.writer(fd, delimiter="\t", quotechar='"')
-                write.writerows(ip2asn)
+            ip2asn.to_csv(
+                f"{self.out_dir}{self.IP2ASN_CLEAN_FILE}",
+                sep="\t",
+                header=False,
+                index=False,
+            )
         return ip2asn
 
     def random_asns(
-        self, asn_table: List[List[str]], asns_to_select: int
+        self, asn_table: pd.DataFrame, asns_to_select: int
     ) -> Dict[int, ASNRoute]:
         """Randomly select ASNs.
 
         Args:
-            asn_table (List[List[str]]): The ASN table to select ASNs from
+            asn_table (pd.DataFrame): The ASN table to select ASNs from
             asns_to_select (int): The number of ASNs to select
 
         Returns:
@@ -266,48 +546,50 @@ class DataGeneration:
             raise ValueError(
                 "More ASNs requested then in the route table provided"
             )
-        # Make a subnet table
-        subnet_table: List[int] = [
-            0
-        ] * 25  # The index is the number of bits and the value is the number of IPs, All subnets are between 8 and 24 in size
-        for i in range(
-            24, 7, -1
-        ):  # Netflow v5 is only 32-bit IPv4 addresses so ranges are only between 8 and 24 bits
-            subnet_table[i] = 2 ** i
         new_table = {}
-        for x in range(asns_to_select):
-            i = randrange(0, len(asn_table))  # nosec: B311
-            # Find subnet
-            subnet = 8
-            for sub in range(24, 7, -1):
-                # Faster in Python to do a negative then a double boolean
-                if (
-                    not int(asn_table[i][1]) - int(asn_table[i][0])
-                    > subnet_table[sub]
-                ):
-                    subnet = sub
-                    break
+        # Pick every row up front without replacement, one gather instead of a delete per pick
+        indices: np.ndarray = self.rng.choice(
+            len(asn_table), size=asns_to_select, replace=False
+        )
+        selected: pd.DataFrame = asn_table.iloc[indices]
+        # The prefix length is 32 less the bit length of the range size, frexp's exponent is the
+        # exact bit length for ints. Netflow v5 is only 32-bit IPv4 so subnets are between 8 and 24 bits
+        range_size: np.ndarray = (selected["end"] - selected["start"]).to_numpy()
+        subnets: np.ndarray = np.clip(32 - np.frexp(range_size)[1], 8, 24)
+        starts: np.ndarray = selected["start"].to_numpy()
+        masks: np.ndarray = np.left_shift(np.int64(0xFFFFFFFF), 32 - subnets) & 0xFFFFFFFF
+        networks: np.ndarray = starts & masks
+        for x, (subnet, network, start, end, asn, country, as_description) in enumerate(
+            zip(
+                subnets.tolist(),
+                networks.tolist(),
+                starts.tolist(),
+                selected["end"].tolist(),
+                selected["asn"].tolist(),
+                selected["cc"].astype(str).tolist(),
+                selected["desc"].astype(str).tolist(),
+            )
+        ):
             route: ASNRoute = {
                 "subnet_bits": subnet,
-                "network_address": int(asn_table[i][0]),
-                "broadcast_address": int(asn_table[i][1]),
-                "ip_range_start": int(asn_table[i][0]) + 2,
-                "ip_range_end": int(asn_table[i][1]) - 1,
-                "asn": int(asn_table[i][2]),
-                "country": asn_table[i][3],
-                "as_description": asn_table[i][4],
+                "network_address": network,
+                "broadcast_address": end,
+                "ip_range_start": start + 2,
+                "ip_range_end": end - 1,
+                "asn": asn,
+                "country": country,
+                "as_description": as_description,
             }
             new_table[route["asn"]] = route
             self.log(
-                f"Selected Route {x + 1} of {asns_to_select} for ASN {asn_table[i][2]}"
+                f"Selected Route {x + 1} of {asns_to_select} for ASN {asn}"
             )
-            del asn_table[i]
         return new_table
 
     def make_route_table(
         self,
         asns: Dict[int, ASNRoute],
-    ) -> Dict[int, ASNRoute]:
+    ) -> RouteTable:
         """Create a new route table.
 
         This will create a new consoldated super route table using randomely selected interface.
@@ -316,61 +598,59 @@ class DataGeneration:
             asns (Dict[int, ASNRoute]): The ASNs that the route table will be constructed from
 
         Returns:
-            Dict[int, ASNRoute]: The completed route table
+            RouteTable: The completed route table as columns in positional order
         """
-        # Convert each interface's next hop address to an int
-        for interface in self.DEFAULT_PEERING_INTERFACES:
-            ip_obj: ipaddress.IPv4Address = ipaddress.ip_address(
-                interface["next_hop"]
-            )
-            interface["next_hop_b"] = ip_obj.packed
-            interface["next_hop_i"] = int.from_bytes(interface["next_hop_b"], "big")
-            
-        for asn in asns:
-            ifindex = randrange(  # nosec: B311
-                0, len(self.DEFAULT_PEERING_INTERFACES)
-            )  # nosec: B311
-            asns[asn]["next_hop"] = self.DEFAULT_PEERING_INTERFACES[ifindex][
-                "next_hop_i"
-            ]
+        # One draw for every route's interface
+        picks: List[int] = self.rng.integers(
+            0, len(self.DEFAULT_PEERING_INTERFACES), len(asns)
+        ).tolist()
+        for asn, pick in zip(asns, picks):
+            interface: NetworkInterface = self.DEFAULT_PEERING_INTERFACES[pick]
+            asns[asn]["next_hop"] = interface["next_hop_i"]
             asns[asn]["ifindex"] = interface["ifindex"]
-            
-        self.route_table = asns
-        return asns
 
-    def build_server_ip_table(self, from_ip: str, to_ip: str) -> List[int]:
-        """Create a list of server ip address as int.
+        routes: List[ASNRoute] = list(asns.values())
+        self._index_route_table(
+            {
+                field: np.array([r[field] for r in routes], dtype=np.int64)
+                for field in RouteTable.__annotations__
+            }
+        )
+        return self.route_table
+
+    def _index_route_table(self, route_table: RouteTable) -> None:
+        """Set the route table and its column views.
+
+        Args:
+            route_table (RouteTable): The route table to use
+        """
+        self.route_table = route_table
+        # Parallel arrays so the batched generator can gather route fields by index
+        self.route_next_hop = route_table["next_hop"]
+        self.route_subnet = route_table["subnet_bits"]
+        self.route_asn = route_table["asn"]
+        self.route_ifindex = route_table["ifindex"]
+        self.route_ip_start = route_table["ip_range_start"]
+        self.route_ip_end = route_table["ip_range_end"]
+
+    def build_server_ip_table(self, from_ip: str, to_ip: str) -> np.ndarray:
+        """Create an array of server ip address as int.
 
         Args:
             from_ip (str): The first IP Address in the range
             to_ip (str): The last IP Address in the range
 
         Returns:
-            List[int]: List of servers address as int
+            np.ndarray: Array of servers address as uint32
         """
-        server_ip_table: List[int] = []
-        ip_start: int = int.from_bytes(
-            ipaddress.ip_address(from_ip).packed,
-            byteorder="big",
-        )
-        ip_end: int = int.from_bytes(
-            ipaddress.ip_address(to_ip).packed,
-            byteorder="big",
-        )
+        ip_start: int = ip_to_int(from_ip)
+        ip_end: int = ip_to_int(to_ip)
         # Check for invesrsion
         if ip_start > ip_end:
-            temp = ip_start
-            ip_start = ip_end
-            ip_end = temp
-            del temp
-
-        i = ip_start
-        stop_at = ip_end + 1
-        while i < stop_at:
-            server_ip_table.append(i)
-            i += 1
-        self.server_list = server_ip_table
-        return server_ip_table
+            ip_start, ip_end = ip_end, ip_start
+
+        self.server_list = np.arange(ip_start, ip_end + 1, dtype=np.uint32)
+        return self.server_list
 
     def random_client(
         self,
@@ -384,37 +664,29 @@ class DataGeneration:
             Tuple[int, int, int, int, int]: Selected_IP_Address: int, Next_Hop_Address: int, Subnet: int, ASN, IFIndex
         """
         # Select a random route
-        route_index = randrange(0, len(self.route_table))  # nosec: B311
-        route: ASNRoute = self.route_table[
-            list(self.route_table.keys())[route_index]
-        ]
+        route: int = int(self.rng.integers(0, self.route_asn.shape[0]))
         
         # Select a random IP from the routes range
-        ip = randrange(  # nosec: B311
-            route["ip_range_start"], route["ip_range_end"]
-        )  # nosec: B311
+        ip = int(self.rng.integers(
+            self.route_ip_start[route], self.route_ip_end[route]
+        ))
         
         return (
             ip,
-            route["next_hop"],
-            route["subnet_bits"],
-            route["asn"],
-            route["ifindex"],
+            int(self.route_next_hop[route]),
+            int(self.route_subnet[route]),
+            int(self.route_asn[route]),
+            int(self.route_ifindex[route]),
         )
 
     def random_server(self) -> int:
         """Randomly select a server IP Address.
 
-        Args:
-            server_list (_type_): List of server IP Addresses
-
         Returns:
             int: The selected servers IP Address as int
         """
-        ip = self.server_list[
-            randrange(0, len(self.server_list))  # nosec: B311
-        ]  # nosec: B311
-        return ip
+        ip = self.server_list[self.rng.integers(0, self.server_list.size)]
+        return int(ip)
 
     def generate_flow_record(
         self,
@@ -432,16 +704,18 @@ class DataGeneration:
         client = self.random_client()
         server = self.random_server()
         # Randomly Select Transfer Sizes for flow set
-        heavy_transfer_size = randint(  # nosec: B311
+        heavy_transfer_size = int(self.rng.integers(
             self.MIN_HEAVY_PACKET_BYTES, 
-            self.MAX_HEAVY_PACKET_BYTES
-        )
-        light_transfer_size = randint(  # nosec: B311
+            self.MAX_HEAVY_PACKET_BYTES,
+            endpoint=True,
+        ))
+        light_transfer_size = int(self.rng.integers(
             self.MIN_LIGHT_PACKET_BYTES, 
-            self.MAX_LIGHT_PACKET_BYTES
-        )
+            self.MAX_LIGHT_PACKET_BYTES,
+            endpoint=True,
+        ))
         # Randomly picked heavy side
-        if randrange(0, 100) > self.SERVER_AS_SOURCE_WEIGHT:  # nosec: B311
+        if self.rng.integers(0, 100) > self.SERVER_AS_SOURCE_WEIGHT:
             client_transfer = heavy_transfer_size
             server_transfer = light_transfer_size
         else:
@@ -453,23 +727,24 @@ class DataGeneration:
             client_transfer // 1200
         )
         # L4 Port
-        client_port: int = randint(  # nosec: B311
+        client_port: int = int(self.rng.integers(
             self.EPHEMERAL_PORTS[0], 
-            self.EPHEMERAL_PORTS[1]
-        )  
+            self.EPHEMERAL_PORTS[1],
+            endpoint=True,
+        ))
         # L3 Flow size in Bytes
         server_packets: int = (
             server_transfer // 1200
         )
         # Flow start time in milliseconds
-        client_start_time: int = time_index - randint(  # nosec: B311
-            1, 60000
-        )
+        client_start_time: int = time_index - int(self.rng.integers(
+            1, 60000, endpoint=True
+        ))
         # Flow start time in milliseconds
-        server_start_time: int = time_index - randint(  # nosec: B311
-            1, 60000
-        )
-        server_port: int = self.SERVER_PORT[randint(0,2)]
+        server_start_time: int = time_index - int(self.rng.integers(
+            1, 60000, endpoint=True
+        ))
+        server_port: int = self.SERVER_PORT[self.rng.integers(0, len(self.SERVER_PORT))]
         
         # Client Flow Record
         client_flow: FlowRecord = {
@@ -497,8 +772,8 @@ class DataGeneration:
         server_time = (
             time_index
             + self.SERVER_LATENCY
-            + randrange(0, self.MAX_JITTER)  # nosec: B311
-        )  # nosec: B311
+            + int(self.rng.integers(0, self.MAX_JITTER))
+        )
         # Server Flow Record
         server_flow: FlowRecord = {
             "timestamp": server_time,
@@ -524,6 +799,155 @@ class DataGeneration:
         }
         return (client_flow, server_flow)
 
+    def _plan_connections(
+        self,
+        time_index_ms: int,
+        flows_per_ms: int,
+        future_times: np.ndarray,
+        span_ms: int = 1000,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick the start times of the new connections for a span of simulated time.
+
+        Each millisecond is topped up with new connections until it holds
+        `flows_per_ms` flows, counting the return flows already due in it. A
+        return flow lands at least `SERVER_LATENCY` ms after its client flow,
+        so the span is planned in blocks of that size.
+
+        Args:
+            time_index_ms (int): The first millisecond of the span
+            flows_per_ms (int): Flow per millisecond
+            future_times (np.ndarray): Timestamps of return flows carried in from earlier spans
+            span_ms (int): The length of the span in milliseconds
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Client flow timestamps, Server flow timestamps
+        """
+        block: int = max(self.SERVER_LATENCY, 1)
+        # Count of return flows due in each millisecond relative to the start of the span
+        pending: np.ndarray = np.bincount(
+            future_times.astype(np.int64) - time_index_ms,
+            minlength=span_ms + self.SERVER_LATENCY + self.MAX_JITTER,
+        )
+        client_times: List[np.ndarray] = []
+        server_times: List[np.ndarray] = []
+        for offset in range(0, span_ms, block):
+            stop: int = min(offset + block, span_ms)
+            new_flows: np.ndarray = np.maximum(flows_per_ms - pending[offset:stop], 0)
+            times: np.ndarray = np.repeat(
+                np.arange(time_index_ms + offset, time_index_ms + stop), new_flows
+            )
+            returns: np.ndarray = (
+                times
+                + self.SERVER_LATENCY
+                + self.rng.integers(0, self.MAX_JITTER, times.shape[0])
+            )
+            pending += np.bincount(returns - time_index_ms, minlength=pending.shape[0])
+            client_times.append(times)
+            server_times.append(returns)
+        return (np.concatenate(client_times), np.concatenate(server_times))
+
+    def _gen_flow_batch(
+        self,
+        time_index: np.ndarray,
+        server_time: np.ndarray,
+        client_flows: Optional[np.ndarray] = None,
+        server_flows: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate flow records for a batch of bidirectional connections.
+
+        This is the vectorized form of `generate_flow_record`, the records are
+        `FLOW_DTYPE` arrays with one entry per connection.
+
+        Args:
+            time_index (np.ndarray): The time index for each client flow
+            server_time (np.ndarray): The time index for each server flow
+            client_flows (Optional[np.ndarray]): `FLOW_DTYPE` array to fill with the client flows,
+                allocated when not given
+            server_flows (Optional[np.ndarray]): `FLOW_DTYPE` array to fill with the server flows,
+                allocated when not given
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Client flow records, Server flow records
+        """
+        n: int = time_index.shape[0]
+        # The random fields are drawn in parallel chunks, each seeded from self.rng
+        chunks: int = -(-n // self.DRAW_CHUNK)
+        if self._draw_buffer.shape[0] < _DRAW_ROWS * n:
+            self._draw_buffer = np.empty(_DRAW_ROWS * n, dtype=np.int64)
+        draws: np.ndarray = self._draw_buffer[:_DRAW_ROWS * n].reshape(_DRAW_ROWS, n)
+        _draw_connections(
+            self.rng.integers(0, 1 << 32, chunks, dtype=np.int64),
+            self.DRAW_CHUNK,
+            time_index.astype(np.int64, copy=False),
+            self.route_ip_start,
+            self.route_ip_end,
+            self.server_list,
+            self._server_ports,
+            (self.MIN_HEAVY_PACKET_BYTES, self.MAX_HEAVY_PACKET_BYTES),
+            (self.MIN_LIGHT_PACKET_BYTES, self.MAX_LIGHT_PACKET_BYTES),
+            self.SERVER_AS_SOURCE_WEIGHT,
+            self.EPHEMERAL_PORTS,
+            draws,
+        )
+        route_idx: np.ndarray = draws[_DRAW_ROUTE]
+        client_ip: np.ndarray = draws[_DRAW_CLIENT_IP]
+        client_next_hop: np.ndarray = self.route_next_hop[route_idx]
+        client_subnet: np.ndarray = self.route_subnet[route_idx]
+        client_asn: np.ndarray = self.route_asn[route_idx]
+        client_ifindex: np.ndarray = self.route_ifindex[route_idx]
+        server: np.ndarray = draws[_DRAW_SERVER_IP]
+        client_transfer: np.ndarray = draws[_DRAW_CLIENT_BYTES]
+        server_transfer: np.ndarray = draws[_DRAW_SERVER_BYTES]
+        client_port: np.ndarray = draws[_DRAW_CLIENT_PORT]
+        server_port: np.ndarray = draws[_DRAW_SERVER_PORT]
+        client_start_time: np.ndarray = draws[_DRAW_CLIENT_START]
+        server_start_time: np.ndarray = draws[_DRAW_SERVER_START]
+        # Client Flow Records
+        if client_flows is None:
+            client_flows = np.empty(n, dtype=FLOW_DTYPE)
+        client_flows["timestamp"] = time_index
+        client_flows["srcaddr"] = client_ip
+        client_flows["dstaddr"] = server
+        client_flows["nexthop"] = self.INTERNAL_IFINDEX["next_hop_i"]
+        client_flows["dPkts"] = client_transfer // 1200
+        client_flows["dOctets"] = client_transfer
+        client_flows["first"] = client_start_time
+        client_flows["last"] = time_index
+        client_flows["srcport"] = client_port
+        client_flows["dstport"] = server_port
+        client_flows["tcp_flags"] = 0
+        client_flows["protocol"] = 6
+        client_flows["tos"] = 0
+        client_flows["src_as"] = client_asn
+        client_flows["dst_as"] = self.INTERNAL_ASN
+        client_flows["src_mask"] = client_subnet
+        client_flows["dst_mask"] = self.INTERNAL_SUBNET
+        client_flows["input"] = client_ifindex
+        client_flows["output"] = self.INTERNAL_IFINDEX["ifindex"]
+        # Server Flow Records
+        if server_flows is None:
+            server_flows = np.empty(n, dtype=FLOW_DTYPE)
+        server_flows["timestamp"] = server_time
+        server_flows["srcaddr"] = server
+        server_flows["dstaddr"] = client_ip
+        server_flows["nexthop"] = client_next_hop
+        server_flows["dPkts"] = server_transfer // 1200
+        server_flows["dOctets"] = server_transfer
+        server_flows["first"] = server_start_time
+        server_flows["last"] = time_index
+        server_flows["srcport"] = server_port
+        server_flows["dstport"] = client_port
+        server_flows["tcp_flags"] = 0
+        server_flows["protocol"] = 6
+        server_flows["tos"] = 0
+        server_flows["src_as"] = self.INTERNAL_ASN
+        server_flows["dst_as"] = client_asn
+        server_flows["src_mask"] = self.INTERNAL_SUBNET
+        server_flows["dst_mask"] = client_subnet
+        server_flows["input"] = self.INTERNAL_IFINDEX["ifindex"]
+        server_flows["output"] = client_ifindex
+        return (client_flows, server_flows)
+
     def to_bytes(self, flow_record: FlowRecord) -> bytes:
         """Format a flow record to bytes.
 
@@ -533,131 +957,246 @@ class DataGeneration:
         Returns:
             bytes: The Netflow v5 formatted in bytes for an HD system
         """
+        system_id = (
+            self._system_id_bytes
+            if flow_record["system_id"] == self.system_id
+            else bytes.fromhex(flow_record["system_id"])
+        )
+        return _FLOW_STRUCT.pack(
+            flow_record["timestamp"] >> 32,
+            flow_record["timestamp"] & 0xFFFFFFFF,
+            system_id,
+            flow_record["srcaddr"],
+            flow_record["dstaddr"],
+            flow_record["nexthop"],
+            flow_record["dPkts"],
+            flow_record["dOctets"],
+            flow_record["srcport"],
+            flow_record["dstport"],
+            flow_record["tcp_flags"],
+            flow_record["protocol"],
+            flow_record["tos"],
+            flow_record["src_as"],
+            flow_record["dst_as"],
+            flow_record["src_mask"],
+            flow_record["dst_mask"],
+            flow_record["input"],
+            flow_record["output"],
+        )
+
+    def _csv_batch(
+        self, rows: np.ndarray, sampled_index: np.ndarray
+    ) -> Tuple[memoryview, memoryview]:
+        """Format a batch of flow rows and its sampled rows as CSV lines.
+
+        Both sets of lines are built by `_format_csv_batch` into reused
+        buffers, the returned views are only valid until the next call.
+
+        Args:
+            rows (np.ndarray): `FLOW_DTYPE` flow records
+            sampled_index (np.ndarray): Row numbers of the sampled flows
+
+        Returns:
+            Tuple[memoryview, memoryview]: The raw CSV lines, The sampled CSV lines
+        """
+        raw_size: int = rows.shape[0] * self._csv_row_max_bytes
+        if self._csv_raw_buffer.shape[0] < raw_size:
+            self._csv_raw_buffer = np.empty(raw_size, dtype=np.uint8)
+        sampled_size: int = sampled_index.shape[0] * self._csv_row_max_bytes
+        if self._csv_sampled_buffer.shape[0] < sampled_size:
+            self._csv_sampled_buffer = np.empty(sampled_size, dtype=np.uint8)
+        raw_len, sampled_len = _format_csv_batch(
+            structured_to_unstructured(rows, dtype=np.uint64),
+            self._system_id_csv,
+            self.CSV_FIELDS.index("system_id"),
+            sampled_index,
+            self._csv_raw_buffer,
+            self._csv_sampled_buffer,
+        )
         return (
-            flow_record["timestamp"].to_bytes(6, byteorder="big")
-            + bytes.fromhex(flow_record["system_id"])
-            + flow_record["srcaddr"].to_bytes(4, byteorder="big")
-            + flow_record["dstaddr"].to_bytes(4, byteorder="big")
-            + flow_record["nexthop"].to_bytes(4, byteorder="big")
-            + flow_record["dPkts"].to_bytes(4, byteorder="big")
-            + flow_record["dOctets"].to_bytes(4, byteorder="big")
-            + flow_record["srcport"].to_bytes(2, byteorder="big")
-            + flow_record["dstport"].to_bytes(2, byteorder="big")
-            + flow_record["tcp_flags"].to_bytes(1, byteorder="big")
-            + flow_record["protocol"].to_bytes(1, byteorder="big")
-            + flow_record["tos"].to_bytes(1, byteorder="big")
-            + flow_record["src_as"].to_bytes(2, byteorder="big")
-            + flow_record["dst_as"].to_bytes(2, byteorder="big")
-            + flow_record["src_mask"].to_bytes(4, byteorder="big")
-            + flow_record["dst_mask"].to_bytes(4, byteorder="big")
-            + flow_record["input"].to_bytes(2, byteorder="big")
-            + flow_record["output"].to_bytes(2, byteorder="big")
+            memoryview(self._csv_raw_buffer)[:raw_len],
+            memoryview(self._csv_sampled_buffer)[:sampled_len],
+        )
+
+    def _open_flow_files(
+        self,
+        suffix: str,
+        flows: int,
+        flows_per_ms: int,
+        sampling_rate: int,
+        binary: bool,
+    ) -> Tuple[BinaryIO, BinaryIO]:
+        """Open the raw and sampled flow files.
+
+        CSV files are opened with `file_factory`. Binary files are memory
+        mapped and pre-sized for the expected number of records, unless a
+        custom `file_factory` was given.
+
+        Args:
+            suffix (str): Appended to `raw_flow` and `sampled_flow` to make the file names
+            flows (int): The number of raw flows expected
+            flows_per_ms (int): Flow per millisecond
+            sampling_rate (int): Sampling rate
+            binary (bool): Open memory mapped files for binary `FLOW_DTYPE` records
+
+        Returns:
+            Tuple[BinaryIO, BinaryIO]: The raw flow file, The sampled flow file
+        """
+        raw_path: str = f"{self.out_dir}raw_flow{suffix}"
+        sampled_path: str = f"{self.out_dir}sampled_flow{suffix}"
+        if not binary or self.file_factory is not open_buffered:
+            return (self.file_factory(raw_path), self.file_factory(sampled_path))
+        # The last milliseconds also hold return flows, the maps grow if this is still short
+        raw_flows: int = flows + flows_per_ms * (self.SERVER_LATENCY + self.MAX_JITTER)
+        return (
+            MemmapFile(raw_path, raw_flows * FLOW_DTYPE.itemsize),
+            MemmapFile(sampled_path, (raw_flows // sampling_rate + 1) * FLOW_DTYPE.itemsize),
         )
 
     def generate_data(
         self,
         flows_to_make: int,
         flows_per_ms: int,
-        job_progress: Progress,
+        job_progress: "Progress",
         job_task: int,
         sampling_rate: int,
+        workers: int = 1,
+        binary: bool = False,
     ) -> Tuple[int, int]:
         """Actual method to make records from synth netflow records.
 
+        Flows are generated as `FLOW_DTYPE` batches of about `BATCH_FLOWS`
+        flows of whole simulated seconds, see `_generate_seconds`. With more then one worker the
+        simulated time is split into contiguous shards that are generated in
+        their own processes and then appended to the CSV files in order.
+        Each shard draws from its own jump of `rng`, so a seeded run only
+        repeats with the same number of workers.
+        With `binary` the flows are written as raw `FLOW_DTYPE` records to
+        `raw_flow.bin` and `sampled_flow.bin` instead, see `read_flows`.
+
         Args:
             flows_to_make (int): The total number of flows needed
             flows_per_ms (int): Flow per millisecond
             job_progress (Progress): Dashboard Progress
             job_task (int): Dashboard Progress Job ID
             sampling_rate (int): Sampling rate
+            workers (int): The number of processes to generate with. Defaults to 1.
+            binary (bool): Write binary `FLOW_DTYPE` records instead of CSV. Defaults to False.
 
         Raises:
             OSError: _description_
         """
-        flow_buffer: Dict[int, List[FlowRecord]] = {}
         time_index_ms: int = 60000 # Start 1 min so first flows can have a postive start time
         total_flows_made: int = 0
         total_sampled_flows_made: int = 0
-        raw_flows: List[FlowRecord] = []
-        fps: int = flows_per_ms * 1000
-        fps_after_sampling: int = fps // sampling_rate
-        fps_after_sampling = fps_after_sampling if fps_after_sampling > 0 else 1
-        segments: int = fps // fps_after_sampling
+        seconds: int = -(-flows_to_make // (flows_per_ms * 1000))
+        workers = max(1, min(workers, seconds))
+        ext: str = "bin" if binary else "csv"
+        # Flows made but not yet shown on the dashboard
+        unreported_flows: int = 0
+
+        def progress(flows: int) -> None:
+            """Advance the dashboard once at least `PROGRESS_STEP` flows are made."""
+            nonlocal unreported_flows
+            unreported_flows += flows
+            if unreported_flows >= self.PROGRESS_STEP:
+                job_progress.update(task_id=job_task, advance=unreported_flows)
+                unreported_flows = 0
         
         try:
-            # Setup output CSV files
-            self.log(f"Creating files {self.out_dir}raw_flow.csv and {self.out_dir}sampled_flow.csv")
-            csv_raw_file: TextIO = open(f"{self.out_dir}raw_flow.csv", "w")
-            csv_sampled_file: TextIO = open(f"{self.out_dir}sampled_flow.csv", "w")
-            
-            current_flow, future_flow = self.generate_flow_record(0)
-            flow_csv_keys = list(current_flow.keys())
+            # Setup output files
+            self.log(f"Creating files {self.out_dir}raw_flow.{ext} and {self.out_dir}sampled_flow.{ext}")
+            csv_raw_file, csv_sampled_file = self._open_flow_files(
+                suffix=f".{ext}",
+                flows=flows_to_make,
+                flows_per_ms=flows_per_ms,
+                sampling_rate=sampling_rate,
+                binary=binary,
+            )
             
-            self.log(f"Writing csv headers to {self.out_dir}raw_flow.csv and {self.out_dir}sampled_flow.csv")
-            raw_flow_csv_writer = csv.DictWriter(csv_raw_file, delimiter=",", quotechar='"', fieldnames=flow_csv_keys)
-            sampled_flow_csv_writer = csv.DictWriter(csv_sampled_file, delimiter=",", quotechar='"', fieldnames=flow_csv_keys)
-            raw_flow_csv_writer.writeheader()
-            sampled_flow_csv_writer.writeheader()
-
-            flows: List[FlowRecord] = []
-            current_flow: FlowRecord = {}
-            future_flow: FlowRecord = {}
+            if not binary:
+                self.log(f"Writing csv headers to {self.out_dir}raw_flow.csv and {self.out_dir}sampled_flow.csv")
+                csv_header: bytes = (",".join(self.CSV_FIELDS) + "\n").encode()
+                csv_raw_file.write(csv_header)
+                csv_sampled_file.write(csv_header)
 
             # Loop to make each record
             self.log(f"Looping to make flows: {total_flows_made} of {flows_to_make}")
-            while total_flows_made < flows_to_make:                    
-                # Loop to genrate the number of flow recrods required for this second
-                for _ in range(1000):
-                    try:
-                        # Check if there are any fuure matching flows in the buffer
-                        flows = flow_buffer[time_index_ms]
-                        del flow_buffer[time_index_ms]  # remove the future flow from the buffer now that it has been added
-                    except KeyError:
-                        flows = []
-
-                    # Loop to genrate the number of flow recrods required for this millisecond
-                    while len(flows) < flows_per_ms:
-                        # Genrate a a new flow record and it's future corsponding return flow
-                        current_flow, future_flow = self.generate_flow_record(
-                            time_index=time_index_ms
-                        )
-                        flows.append(current_flow)  # add the current flow to the list of flows
-                        del current_flow  # free memory
+            if workers == 1:
+                total_flows_made, total_sampled_flows_made = self._generate_seconds(
+                    time_index_ms=time_index_ms,
+                    seconds=seconds,
+                    flows_per_ms=flows_per_ms,
+                    sampling_rate=sampling_rate,
+                    csv_raw_file=csv_raw_file,
+                    csv_sampled_file=csv_sampled_file,
+                    progress=progress,
+                    binary=binary,
+                )
+            else:
+                self.log(f"Generating {seconds} seconds of flows in {workers} shards")
+                mp_context = get_context("spawn")
+                # Workers post the flows made per batch so the dashboard moves while they run
+                progress_queue = mp_context.Queue()
+
+                def drain_progress() -> None:
+                    """Pass the flow counts posted by the workers on to the dashboard."""
+                    while True:
                         try:
-                            # Add the future corsponding flow to the future flow buffer
-                            flow_buffer[future_flow["timestamp"]].append(
-                                future_flow
+                            flows: int = progress_queue.get_nowait()
+                        except queue.Empty:
+                            return
+                        progress(flows)
+
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=mp_context,
+                    initializer=_init_shard_worker,
+                    # Split the cores between the workers' numba threads
+                    initargs=(progress_queue, max(1, (os.cpu_count() or 1) // workers)),
+                ) as executor:
+                    shards = []
+                    for shard in range(workers):
+                        first_second: int = shard * seconds // workers
+                        shards.append(
+                            executor.submit(
+                                _generate_shard,
+                                out_dir=self.out_dir,
+                                system_id=bytes.fromhex(self.system_id),
+                                file_factory=self.file_factory,
+                                # Each shard jumps 2**127 steps ahead so the streams never overlap
+                                rng=np.random.Generator(self.rng.bit_generator.jumped(shard + 1)),
+                                route_table=self.route_table,
+                                server_list=self.server_list,
+                                shard=shard,
+                                time_index_ms=time_index_ms + first_second * 1000,
+                                seconds=(shard + 1) * seconds // workers - first_second,
+                                flows_per_ms=flows_per_ms,
+                                sampling_rate=sampling_rate,
+                                binary=binary,
+                                # Overlaps the shard before so the boundary has its returns in flight
+                                lead_in_seconds=min(first_second, self.SHARD_LEAD_IN_SECONDS),
                             )
-                        except KeyError:
-                            flow_buffer[future_flow["timestamp"]] = [future_flow]
-                        del future_flow  # free memory
-                    total_flows_made += len(flows)
-                    
-                    # Write flows files
-                    for flow_record in flows:
-                        raw_flow_csv_writer.writerow(flow_record)
-                    
-                    # Add the flows to a second buffer
-                    raw_flows.extend(flows)
-                    
-                    # Set next loop
-                    time_index_ms += 1
-                    flows.clear()
-                
-                start_index: int = 0
-                end_index: int = sampling_rate - 1
-                for _ in range(segments):
-                    random_flow: int = randint(start_index, end_index)
-                    random_flow = random_flow if random_flow < len(raw_flows) else len(raw_flows) - 1
-                    sampled_flow_csv_writer.writerow(raw_flows[random_flow])
-                    start_index = end_index + 1
-                    end_index = end_index + sampling_rate - 1
-                    total_sampled_flows_made += 1
-                raw_flows.clear()
-                job_progress.update(
-                    task_id=job_task,
-                    advance=fps,
-                )
+                        )
+                    running = set(shards)
+                    while running:
+                        _, running = wait(running, timeout=0.25)
+                        drain_progress()
+                    # Append the shards in time order
+                    for shard, future in enumerate(shards):
+                        shard_flows, shard_sampled_flows = future.result()
+                        for name, csv_file in (
+                            ("raw_flow", csv_raw_file),
+                            ("sampled_flow", csv_sampled_file),
+                        ):
+                            shard_file_name: str = f"{self.out_dir}{name}_{shard}.{ext}"
+                            with open(shard_file_name, "rb") as shard_file:
+                                shutil.copyfileobj(shard_file, csv_file, self.WRITE_BUFFER_SIZE)
+                            os.remove(shard_file_name)
+                        total_flows_made += shard_flows
+                        total_sampled_flows_made += shard_sampled_flows
+                        self.log(f"Shard {shard + 1} of {workers} made {shard_flows} flows")
+                progress_queue.close()
                     
         except OSError as e:
             if e.errno == 12:
@@ -677,7 +1216,402 @@ class DataGeneration:
                     csv_sampled_file.close()
             except OSError:
                 pass
-            del raw_flows
-            del flows
         
+        # One absolute update settles whatever was still below PROGRESS_STEP
+        job_progress.update(task_id=job_task, completed=total_flows_made)
+        return (total_flows_made, total_sampled_flows_made)
+
+    def _generate_seconds(
+        self,
+        time_index_ms: int,
+        seconds: int,
+        flows_per_ms: int,
+        sampling_rate: int,
+        csv_raw_file: BinaryIO,
+        csv_sampled_file: BinaryIO,
+        progress: Callable[[int], None],
+        binary: bool = False,
+        lead_in_seconds: int = 0,
+    ) -> Tuple[int, int]:
+        """Generate and write a contiguous run of simulated seconds.
+
+        Whole seconds are grouped into batches of about `BATCH_FLOWS` flows,
+        each batch is generated, sampled and written in one go. The
+        `lead_in_seconds` before `time_index_ms` are generated but not
+        written, only the return flows they carry into the run are kept.
+
+        Args:
+            time_index_ms (int): The first millisecond to generate
+            seconds (int): The number of seconds to generate
+            flows_per_ms (int): Flow per millisecond
+            sampling_rate (int): Sampling rate
+            csv_raw_file (BinaryIO): File the raw flow rows are written to
+            csv_sampled_file (BinaryIO): File the sampled flow rows are written to
+            progress (Callable[[int], None]): Called with the number of flows made after each batch
+            binary (bool): Write binary `FLOW_DTYPE` records instead of CSV lines
+            lead_in_seconds (int): Seconds simulated before `time_index_ms` only for their return flows
+
+        Returns:
+            Tuple[int, int]: Raw flows made, Sampled flows made
+        """
+        total_flows_made: int = 0
+        total_sampled_flows_made: int = 0
+        batch_seconds: int = max(self.BATCH_FLOWS // (flows_per_ms * 1000), 1)
+        # Return flows that fall into a later batch than the one they were generated in
+        future_flows: np.ndarray = np.empty(0, dtype=FLOW_DTYPE)
+        # Per batch work buffers, a batch is at most one client and one server flow per ms slot
+        # plus the carried return flows, they only grow if a batch overflows them
+        flows: np.ndarray = np.empty(2 * flows_per_ms * 1000 * batch_seconds, dtype=FLOW_DTYPE)
+        raw_flows: np.ndarray = np.empty_like(flows)
+        # Systematic n:1 sampling from a random first flow
+        sample_offset: int = int(self.rng.integers(0, sampling_rate))
+
+        # The lead in batches come first and are not written
+        batches: List[Tuple[int, bool]] = [
+            (min(batch_seconds, lead_in_seconds - batch_start), False)
+            for batch_start in range(0, lead_in_seconds, batch_seconds)
+        ] + [
+            (min(batch_seconds, seconds - batch_start), True)
+            for batch_start in range(0, seconds, batch_seconds)
+        ]
+        time_index_ms -= lead_in_seconds * 1000
+
+        for span_seconds, write in batches:
+            span_ms: int = span_seconds * 1000
+            batch_end: int = time_index_ms + span_ms
+            client_times, server_times = self._plan_connections(
+                time_index_ms=time_index_ms,
+                flows_per_ms=flows_per_ms,
+                future_times=future_flows["timestamp"],
+                span_ms=span_ms,
+            )
+            connections: int = client_times.shape[0]
+            carried: int = future_flows.shape[0]
+            cursor: int = carried + 2 * connections
+            if cursor > flows.shape[0]:
+                flows = np.empty(cursor, dtype=FLOW_DTYPE)
+                raw_flows = np.empty_like(flows)
+            # Return flows first so that within a millisecond they precede new connections,
+            # the new flows are generated straight into the work buffer after them
+            flows[:carried] = future_flows
+            self._gen_flow_batch(
+                time_index=client_times,
+                server_time=server_times,
+                client_flows=flows[carried + connections:cursor],
+                server_flows=flows[carried:carried + connections],
+            )
+            batch_flows: np.ndarray = flows[:cursor]
+            in_batch: np.ndarray = batch_flows["timestamp"] < batch_end
+            if not write:
+                future_flows = batch_flows[~in_batch]
+                time_index_ms = batch_end
+                continue
+            order: np.ndarray = np.flatnonzero(in_batch)
+            order = order[np.argsort(batch_flows["timestamp"][order], kind="stable")]
+            flow_count: int = order.shape[0]
+            batch_raw: np.ndarray = raw_flows[:flow_count]
+            np.take(batch_flows, order, out=batch_raw)
+            # Copied out as the next batch overwrites the work buffer
+            future_flows = batch_flows[~in_batch]
+            total_flows_made += flow_count
+
+            # Take every `sampling_rate`th flow, the stride carries on across batches
+            sampled_index: np.ndarray = np.arange(sample_offset, flow_count, sampling_rate)
+            sample_offset = (sample_offset - flow_count) % sampling_rate
+
+            # Write flows files, both are formatted in one pass
+            if binary:
+                csv_raw_file.write(batch_raw.view(np.uint8))
+                csv_sampled_file.write(batch_raw[sampled_index].view(np.uint8))
+            else:
+                raw_csv, sampled_csv = self._csv_batch(batch_raw, sampled_index)
+                csv_raw_file.write(raw_csv)
+                csv_sampled_file.write(sampled_csv)
+            total_sampled_flows_made += sampled_index.shape[0]
+
+            # Set next loop
+            time_index_ms = batch_end
+            progress(flow_count)
+
         return (total_flows_made, total_sampled_flows_made)
+
+class MemmapFile:
+    """A write only file backed by a growable `np.memmap`.
+
+    Writes are copied straight into the mapped pages, on close the map is
+    flushed and the file is truncated to the bytes written.
+    """
+
+    def __init__(self, path: str, size: int) -> None:
+        """Create the file and map `size` bytes of it.
+
+        Args:
+            path (str): The file to create
+            size (int): The number of bytes to pre-allocate
+        """
+        self.path = path
+        self.closed = False
+        self._pos = 0
+        self._map = self._map_file(max(size, mmap.PAGESIZE), mode="w+")
+
+    def _map_file(self, size: int, mode: str) -> np.memmap:
+        """Size the file and map it.
+
+        Args:
+            size (int): The size of the file in bytes
+            mode (str): `np.memmap` mode
+
+        Returns:
+            np.memmap: The mapped bytes
+        """
+        if mode == "r+":
+            os.truncate(self.path, size)
+        mapped = np.memmap(self.path, dtype=np.uint8, mode=mode, shape=(size,))
+        if hasattr(os, "posix_fallocate"):
+            # Reserve the blocks up front so the page writeback does not fragment the file
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                os.posix_fallocate(fd, 0, size)
+            finally:
+                os.close(fd)
+        return mapped
+
+    def write(self, data) -> int:
+        """Copy bytes into the file.
+
+        Args:
+            data: Any bytes-like object
+
+        Returns:
+            int: The number of bytes written
+        """
+        view: np.ndarray = np.frombuffer(data, dtype=np.uint8)
+        end: int = self._pos + view.shape[0]
+        if end > self._map.shape[0]:
+            self._map.flush()
+            self._map = self._map_file(max(end, self._map.shape[0] * 2), mode="r+")
+        self._map[self._pos:end] = view
+        self._pos = end
+        return view.shape[0]
+
+    def flush(self) -> None:
+        """Flush the mapped pages to the file."""
+        if not self.closed:
+            self._map.flush()
+
+    def close(self) -> None:
+        """Flush, unmap and truncate the file to the bytes written."""
+        if self.closed:
+            return
+        self._map.flush()
+        del self._map
+        os.truncate(self.path, self._pos)
+        self.closed = True
+
+    def __enter__(self) -> "MemmapFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class DirectFile:
+    """A write only file opened with `O_DIRECT` that bypasses the page cache.
+
+    Writes are gathered in a page aligned anonymous mmap and written out a
+    whole buffer at a time. The last partial buffer is padded to the block
+    size on close and the file is truncated back to the bytes written.
+    """
+
+    BLOCK_SIZE: int = 4096  # O_DIRECT offsets and lengths are multiples of the block size
+    BUFFER_SIZE: int = 4 << 20  # 4 MiB aligned write buffer
+
+    def __init__(self, path: str) -> None:
+        """Create the file.
+
+        Args:
+            path (str): The file to create
+
+        Raises:
+            OSError: The file system does not support `O_DIRECT`
+        """
+        self.path = path
+        self.closed = False
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT, 0o644)
+        self._buffer = mmap.mmap(-1, self.BUFFER_SIZE)
+        self._fill = 0
+        self._offset = 0
+
+    def write(self, data) -> int:
+        """Copy bytes into the write buffer, writing it out each time it fills.
+
+        Args:
+            data: Any bytes-like object
+
+        Returns:
+            int: The number of bytes written
+        """
+        with memoryview(data) as source, source.cast("B") as view:
+            done: int = 0
+            while done < len(view):
+                n: int = min(len(view) - done, self.BUFFER_SIZE - self._fill)
+                self._buffer[self._fill:self._fill + n] = view[done:done + n]
+                self._fill += n
+                done += n
+                if self._fill == self.BUFFER_SIZE:
+                    self._write_buffer(self.BUFFER_SIZE)
+            return len(view)
+
+    def _write_buffer(self, length: int) -> None:
+        """Write the first `length` bytes of the buffer at the current offset.
+
+        Args:
+            length (int): A multiple of `BLOCK_SIZE`
+        """
+        with memoryview(self._buffer) as view:
+            os.pwrite(self._fd, view[:length], self._offset)
+        self._offset += self._fill
+        self._fill = 0
+
+    def flush(self) -> None:
+        """Nothing to do, only whole blocks can be written until close."""
+
+    def close(self) -> None:
+        """Write the padded last block, truncate to the bytes written and close."""
+        if self.closed:
+            return
+        size: int = self._offset + self._fill
+        if self._fill:
+            self._write_buffer(-(-self._fill // self.BLOCK_SIZE) * self.BLOCK_SIZE)
+        os.ftruncate(self._fd, size)
+        os.close(self._fd)
+        self._buffer.close()
+        self.closed = True
+
+    def __enter__(self) -> "DirectFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def open_direct(path: str) -> BinaryIO:
+    """Open an output file with `O_DIRECT`, or buffered where that is not supported.
+
+    Args:
+        path (str): The file to create
+
+    Returns:
+        BinaryIO: The file
+    """
+    if hasattr(os, "O_DIRECT"):
+        try:
+            return DirectFile(path)
+        except OSError:
+            # EINVAL from file systems such as tmpfs that do not support O_DIRECT
+            pass
+    return open_buffered(path)
+
+def open_buffered(path: str) -> BinaryIO:
+    """Open an output file behind a `WRITE_BUFFER_SIZE` BufferedWriter.
+
+    Args:
+        path (str): The file to create
+
+    Returns:
+        BinaryIO: The buffered file
+    """
+    return io.BufferedWriter(
+        io.FileIO(path, "wb"), buffer_size=DataGeneration.WRITE_BUFFER_SIZE
+    )
+
+# Set in each worker process by `_init_shard_worker`
+_shard_progress_queue = None
+
+def _init_shard_worker(progress_queue, threads: int) -> None:
+    """Set up a shard worker process.
+
+    Args:
+        progress_queue (multiprocessing.Queue): Queue the flows made per batch are posted to
+        threads (int): The number of numba threads the worker may use
+    """
+    global _shard_progress_queue
+    _shard_progress_queue = progress_queue
+    set_num_threads(threads)
+
+def _post_shard_progress(flows: int) -> None:
+    """Post the flows made by a shard batch to the parent process.
+
+    Args:
+        flows (int): Flows made
+    """
+    if _shard_progress_queue is not None:
+        _shard_progress_queue.put(flows)
+
+def _generate_shard(
+    out_dir: str,
+    system_id: bytes,
+    file_factory: Callable[[str], BinaryIO],
+    rng: np.random.Generator,
+    route_table: RouteTable,
+    server_list: np.ndarray,
+    shard: int,
+    time_index_ms: int,
+    seconds: int,
+    flows_per_ms: int,
+    sampling_rate: int,
+    binary: bool = False,
+    lead_in_seconds: int = 0,
+) -> Tuple[int, int]:
+    """Generate one time shard into its own `raw_flow_<shard>` and `sampled_flow_<shard>` files.
+
+    Runs in a worker process. The shard simulates `lead_in_seconds` before
+    its start so it begins with the return flows of the shard before it in
+    flight, the ones that would land after its end are left to the next
+    shard's lead in.
+
+    Args:
+        out_dir (str): Output directory
+        system_id (bytes): System ID of the parent generator
+        file_factory (Callable[[str], BinaryIO]): The parent's output file opener
+        rng (np.random.Generator): Independent random stream for this shard
+        route_table (RouteTable): The parent's route table
+        server_list (np.ndarray): The parent's server table
+        shard (int): Shard number
+        time_index_ms (int): The first millisecond of the shard
+        seconds (int): The number of seconds in the shard
+        flows_per_ms (int): Flow per millisecond
+        sampling_rate (int): Sampling rate
+        binary (bool): Write binary `FLOW_DTYPE` records instead of CSV
+        lead_in_seconds (int): Seconds simulated before the shard only for their return flows
+
+    Returns:
+        Tuple[int, int]: Raw flows made, Sampled flows made
+    """
+    ext: str = "bin" if binary else "csv"
+    gen = DataGeneration(
+        log=lambda message: None,
+        out_dir=out_dir,
+        system_id=system_id,
+        file_factory=file_factory,
+    )
+    gen.rng = rng
+    gen._index_route_table(route_table)
+    gen.server_list = server_list
+    csv_raw_file, csv_sampled_file = gen._open_flow_files(
+        suffix=f"_{shard}.{ext}",
+        flows=seconds * 1000 * flows_per_ms,
+        flows_per_ms=flows_per_ms,
+        sampling_rate=sampling_rate,
+        binary=binary,
+    )
+    with csv_raw_file, csv_sampled_file:
+        return gen._generate_seconds(
+            time_index_ms=time_index_ms,
+            seconds=seconds,
+            flows_per_ms=flows_per_ms,
+            sampling_rate=sampling_rate,
+            csv_raw_file=csv_raw_file,
+            csv_sampled_file=csv_sampled_file,
+            progress=_post_shard_progress,
+            binary=binary,
+            lead_in_seconds=lead_in_seconds,
+        )
@@ -16,79 +16,71 @@ __status__ = "Development"
 __version__ = "0.0.1"
 
 import argparse
+import os
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import (
+    TYPE_CHECKING,
+    Callable,
     List,
     Tuple,
+    TypedDict,
 )
 
-from blessed import Terminal
-from rich.align import Align
-from rich.console import (
-    Console,
-    Group,
-    ConsoleOptions,
-    RenderResult,
-    RenderableType,
-)
-from rich.highlighter import ReprHighlighter
-from rich.layout import Layout
-from rich.live import Live
-from rich.panel import Panel
-from rich.progress import (
-    BarColumn,
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-)
-from rich.style import StyleType
-from rich.table import Table
-from rich.text import Text
+if TYPE_CHECKING:
+    from rich.progress import Progress
 
-class LoggingWindow:
-    """An internal renderable used as a Layout logger."""
+@lru_cache(maxsize=1)
+def _utc_second(second: int) -> str:
+    """Format a Unix second as an ISO 8601 UTC date and time.
 
-    highlighter = ReprHighlighter()
-    logs: List[str]
+    Cached as every log within the same second shares it.
 
-    def __init__(self, style: StyleType = "") -> None:
-        """Rich Renderable Logging Window.
+    Args:
+        second (int): Seconds since the epoch
 
-        Args:
-            style (StyleType, optional): Rich style. Defaults to "".
-        """
-        self.style = style
-        self.logs = []
+    Returns:
+        str: The date and time to the second
+    """
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
 
-    def append(self, message: RenderableType) -> None:
-        """Add new element to be rendered.
+def log_timestamp() -> str:
+    """Get the current UTC time for a log line.
 
-        Args:
-            message (RenderableType): The Rich renderable to add
-        """
-        self.logs.append(message)
+    Returns:
+        str: ISO 8601 UTC time to the millisecond with a Z suffix
+    """
+    now_ms: int = time.time_ns() // 1_000_000
+    return f"{_utc_second(now_ms // 1000)}.{now_ms % 1000:03d}Z"
 
-    def __rich_console__(
-        self, console: Console, options: ConsoleOptions
-    ) -> RenderResult:
-        """Call by console.
+def elapsed_minutes(start: float) -> Tuple[int, int]:
+    """Get the time passed since `start`.
 
-        Args:
-            console (Console): Rich console
-            options (ConsoleOptions): Rich console metadata
+    Args:
+        start (float): `time.perf_counter()` when timing started
 
-        Returns:
-            RenderResult: Rich rendering info
+    Returns:
+        Tuple[int, int]: Minutes, Seconds
+    """
+    return divmod(int(time.perf_counter() - start), 60)
 
-        Yields:
-            Iterator[RenderResult]: Rich rendering info
+class NullProgress:
+    """Stand in for a Rich Progress when the rich UI is not used."""
+
+    def update(self, task_id: int, **kwargs) -> None:
+        """Ignore a progress update.
+
+        Args:
+            task_id (int): Progress Job ID
         """
-        height = options.height or options.size.height
-        while len(self.logs) > height - 2:
-            self.logs.pop(0)
-        yield Panel(Group(*self.logs), title="Logs", title_align="left")
 
-if __name__ == "__main__":
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser for the generator's options
+    """
     parser = argparse.ArgumentParser(
         description="FermiHDI Generate Synth Netflow"
     )
@@ -113,6 +105,34 @@ if __name__ == "__main__":
         default=1000,
         help="The n:1 flow sampling to be emulated, defaults to 1000",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="The number of processes used to generate flows, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "-b",
+        "--binary",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+        help="Write and read the flow files as binary records instead of CSV",
+    )
+    parser.add_argument(
+        "--direct_io",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+        help="Write the flow files with O_DIRECT, bypassing the page cache",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the random generator to make a run reproducible with the same --workers, random when not set",
+    )
     parser.add_argument(
         "-o",
         "--output_dir",
@@ -144,6 +164,13 @@ if __name__ == "__main__":
         default=True,
         help="Genrate perring reports",
     )
+    parser.add_argument(
+        "--stream_peering",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+        help="Read the raw flows file in chunks for the reports rather than loading it whole, to bound their memory",
+    )
     parser.add_argument(
         "--topN",
         type=int,
@@ -170,7 +197,110 @@ if __name__ == "__main__":
         default=False,
         help="Auto exit when done"
     )
-    args = parser.parse_args()
+    return parser
+
+class RunStats(TypedDict):
+    """A Typing object for the results of a run."""
+
+    total_flows_made: int
+    total_sampled_flows_made: int
+    gen_minutes: Tuple[int, int]
+    report_minutes: Tuple[int, int]
+
+def run(
+    args: argparse.Namespace,
+    log: Callable[[str], None],
+    data_dir: str,
+    total_flows_to_make: int,
+    flows_per_ms: int,
+    rt_progress: "Progress | NullProgress" = NullProgress(),
+    rt_job_id: int = 0,
+    job_progress: "Progress | NullProgress" = NullProgress(),
+    cd_job_id: int = 0,
+    report_gen_progress: "Progress | NullProgress" = NullProgress(),
+    report_gen_job_id: int = 0,
+) -> RunStats:
+    """Generate the flows and reports asked for on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed command line
+        log (Callable[[str], None]): Logging function
+        data_dir (str): Directory the files are written to, with a trailing slash when set
+        total_flows_to_make (int): The number of flows to make
+        flows_per_ms (int): Flow per millisecond
+        rt_progress (Progress | NullProgress, optional): Route table progress. Defaults to NullProgress().
+        rt_job_id (int, optional): Route table progress Job ID. Defaults to 0.
+        job_progress (Progress | NullProgress, optional): Flow generation progress. Defaults to NullProgress().
+        cd_job_id (int, optional): Flow generation progress Job ID. Defaults to 0.
+        report_gen_progress (Progress | NullProgress, optional): Report progress. Defaults to NullProgress().
+        report_gen_job_id (int, optional): Report progress Job ID. Defaults to 0.
+
+    Returns:
+        RunStats: Flows made and the time taken by each step
+    """
+    stats: RunStats = {
+        "total_flows_made": 0,
+        "total_sampled_flows_made": 0,
+        "gen_minutes": (0, 0),
+        "report_minutes": (0, 0),
+    }
+    if not args.reports_only:
+        from data_gen import DataGeneration, open_direct
+        gen = DataGeneration(
+            log=log,
+            out_dir=data_dir,
+            seed=args.seed,
+            file_factory=open_direct if args.direct_io else None,
+        )
+
+        start_time = time.perf_counter()
+        
+        log("Getting ASNs")
+        asn_table = gen.get_asns()
+        rt_progress.update(task_id=rt_job_id, advance=1)
+        log("Selecting ASNs")
+        selected_asns = gen.random_asns(
+            asn_table=asn_table, asns_to_select=1000
+        )
+        rt_progress.update(task_id=rt_job_id, advance=1)
+        log("Building Route Table")
+        gen.make_route_table(asns=selected_asns)
+        rt_progress.update(task_id=rt_job_id, advance=1)
+        log("Building Server Table")
+        gen.build_server_ip_table(
+            from_ip=gen.SERVER_RANGE[0], to_ip=gen.SERVER_RANGE[1]
+        )
+        rt_progress.update(task_id=rt_job_id, advance=1)
+        gen.log("Generating Flow Data")
+        stats["total_flows_made"], stats["total_sampled_flows_made"] = gen.generate_data(
+            flows_to_make=total_flows_to_make,
+            flows_per_ms=flows_per_ms,
+            job_progress=job_progress,
+            job_task=cd_job_id,
+            sampling_rate=args.sampling_rate,
+            workers=args.workers,
+            binary=args.binary,
+        )
+        
+        stats["gen_minutes"] = elapsed_minutes(start_time)
+        
+    if not args.no_reports:
+        from graph import Graphing
+        reports = Graphing(output_dir=data_dir, log=log, binary=args.binary, seed=args.seed)
+        
+        start_time = time.perf_counter()
+        reports.genrate_reports(
+            genrate_peering_report=args.peering_report, 
+            topn=args.topN, 
+            stream_peering=args.stream_peering,
+            report_gen_progress=report_gen_progress, 
+            report_gen_job_id=report_gen_job_id
+        )
+        stats["report_minutes"] = elapsed_minutes(start_time)
+    return stats
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
     
     data_dir: str = args.output_dir     
     if (len(args.output_dir) > 0 and not args.output_dir.endswith("/")):
@@ -183,110 +313,117 @@ if __name__ == "__main__":
         flows_per_ms = flows_per_ms if flows_per_ms > 0 else 1
         total_flows_to_make = (args.time * 1000 * flows_per_ms)
     
-    layout = Layout(name="root")
-    layout.split(
-        Layout(name="header", size=3),
-        Layout(name="main", ratio=1),
-        Layout(name="footer", size=3),
-    )
-    layout["main"].split_row(
-        Layout(name="body", ratio=2),
-        Layout(name="side", minimum_size=20),
-    )
-    layout["side"].split(
-        Layout(name="info"),
-        Layout(name="meta", size=6),
-        Layout(name="commands"),
-    )
-    layout["header"].update(
-        Panel(Text("FermiHDI Flow Genrator", justify="center"))
-    )
-    layout["footer"].update(
-        Panel(Text("© COPYRIGHT 2024 FERMIHDI LIMITED", justify="center"))
-    )
-    logging_window = LoggingWindow()
-    layout["body"].update(logging_window)
-        
-    # Setup the info display
-    rt_progress = Progress(
-        "{task.description}",
-        SpinnerColumn(),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        expand=False,
-    )
-    rt_job_id = rt_progress.add_task("[cyan]Route Table ", total=4)
-    
-    job_progress = Progress(
-        "{task.description}",
-        SpinnerColumn(),
-        BarColumn(),
-        TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
-        expand=False,
-    )
-    cd_job_id = job_progress.add_task(
-        "[cyan]Generating Data", total=total_flows_to_make
-    )
+    started_at = datetime.now(timezone.utc)
     
-    report_gen_progress = Progress(
-        "{task.description}",
-        SpinnerColumn(),
-        BarColumn(),
-        TextColumn("{task.completed} of {task.total}"),
-        expand=False,
-    )
-    report_jobs = 15
-    if args.peering_report:
-        report_jobs = 16
-    report_gen_job_id = report_gen_progress.add_task(
-        "[cyan]Generating Reports ", total=report_jobs
-    )
+    if args.rich:
+        # The rich UI is only imported when it is used
+        from blessed import Terminal
+        from rich.align import Align
+        from rich.console import Group
+        from rich.layout import Layout
+        from rich.live import Live
+        from rich.panel import Panel
+        from rich.progress import (
+            BarColumn,
+            Progress,
+            SpinnerColumn,
+            TextColumn,
+        )
+        from rich.table import Table
+        from rich.text import Text
+        from rich_ui import LoggingWindow
+
+        layout = Layout(name="root")
+        layout.split(
+            Layout(name="header", size=3),
+            Layout(name="main", ratio=1),
+            Layout(name="footer", size=3),
+        )
+        layout["main"].split_row(
+            Layout(name="body", ratio=2),
+            Layout(name="side", minimum_size=20),
+        )
+        layout["side"].split(
+            Layout(name="info"),
+            Layout(name="meta", size=6),
+            Layout(name="commands"),
+        )
+        layout["header"].update(
+            Panel(Text("FermiHDI Flow Genrator", justify="center"))
+        )
+        layout["footer"].update(
+            Panel(Text("© COPYRIGHT 2024 FERMIHDI LIMITED", justify="center"))
+        )
+        logging_window = LoggingWindow()
+        layout["body"].update(logging_window)
+        
+        # Setup the info display, only with the progress bars for the steps that will run
+        rt_progress = job_progress = report_gen_progress = NullProgress()
+        rt_job_id = cd_job_id = report_gen_job_id = 0
+        meta_progress: List[Progress] = []
+        if not args.reports_only:
+            rt_progress = Progress(
+                "{task.description}",
+                SpinnerColumn(),
+                BarColumn(),
+                TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+                expand=False,
+            )
+            rt_job_id = rt_progress.add_task("[cyan]Route Table ", total=4)
     
-    if args.no_reports:
-        layout["meta"].update(
-            Panel(
-                Align.center(
-                    Group(rt_progress, job_progress), vertical="middle"
-                )
+            job_progress = Progress(
+                "{task.description}",
+                SpinnerColumn(),
+                BarColumn(),
+                TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
+                expand=False,
             )
-        )
+            cd_job_id = job_progress.add_task(
+                "[cyan]Generating Data", total=total_flows_to_make
+            )
+            meta_progress += [rt_progress, job_progress]
     
-    if args.reports_only:
-        layout["meta"].update(
-            Panel(
-                Align.center(
-                    Group(report_gen_progress), vertical="middle"
-                )
+        if not args.no_reports:
+            report_gen_progress = Progress(
+                "{task.description}",
+                SpinnerColumn(),
+                BarColumn(),
+                TextColumn("{task.completed} of {task.total}"),
+                expand=False,
             )
-        )
+            report_jobs = 15
+            if args.peering_report:
+                report_jobs = 16
+            report_gen_job_id = report_gen_progress.add_task(
+                "[cyan]Generating Reports ", total=report_jobs
+            )
+            meta_progress.append(report_gen_progress)
     
-    if not args.no_reports and not args.reports_only:
         layout["meta"].update(
             Panel(
                 Align.center(
-                    Group(rt_progress, job_progress, report_gen_progress), vertical="middle"
+                    Group(*meta_progress), vertical="middle"
                 )
             )
         )
 
-    info_table = Table(box=None)
-    info_table.add_column(justify="left", no_wrap=True)
-    info_table.add_column(justify="left", no_wrap=True)
-    info_table.add_row("Total Flow Records:", f"{total_flows_to_make:n}")
-    write_dir="Curent Directory" if len(data_dir) == 0 else data_dir
-    info_table.add_row("Writing files to:", f"{write_dir}")
-    info_table.add_row("Started at:", f"{datetime.now(timezone.utc)}",)
-    layout["info"].update(
-        Panel(info_table, title="Information")
-    )
+        info_table = Table(box=None)
+        info_table.add_column(justify="left", no_wrap=True)
+        info_table.add_column(justify="left", no_wrap=True)
+        info_table.add_row("Total Flow Records:", f"{total_flows_to_make:n}")
+        write_dir="Curent Directory" if len(data_dir) == 0 else data_dir
+        info_table.add_row("Writing files to:", f"{write_dir}")
+        info_table.add_row("Started at:", f"{started_at}",)
+        layout["info"].update(
+            Panel(info_table, title="Information")
+        )
 
-    command_table = Table(box=None, title="Commands")
-    command_table.add_column(justify="left", no_wrap=True)
-    command_table.add_column(justify="left", no_wrap=True)
-    command_table.add_row("q:", "Exit")
-    layout["commands"].update(Panel(command_table))
+        command_table = Table(box=None, title="Commands")
+        command_table.add_column(justify="left", no_wrap=True)
+        command_table.add_column(justify="left", no_wrap=True)
+        command_table.add_row("q:", "Exit")
+        layout["commands"].update(Panel(command_table))
 
-    if args.rich:
         def log(message: str) -> None:
             """Print a log.
 
@@ -296,7 +433,7 @@ if __name__ == "__main__":
             logging_window.append(
                 Text.assemble(
                     (
-                        f"{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}Z",
+                        log_timestamp(),
                         "cyan",
                     ),
                     f" {message}",
@@ -309,67 +446,34 @@ if __name__ == "__main__":
             Args:
                 message (str): log message
             """
-            print(f"{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}Z {message}")
+            print(f"{log_timestamp()} {message}")
 
     total_minutes: Tuple[int, int] = (0, 0)
-    gen_minutes: Tuple[int, int] = (0, 0)
-    report_minutes: Tuple[int, int] = (0, 0)
-    total_start_time = datetime.now()
+    stats: RunStats = {
+        "total_flows_made": 0,
+        "total_sampled_flows_made": 0,
+        "gen_minutes": (0, 0),
+        "report_minutes": (0, 0),
+    }
+    total_start_time = time.perf_counter()
     
     if args.rich:
         try:
-            with Live(layout, refresh_per_second=10, screen=True):
-                if not args.reports_only:
-                    from data_gen import DataGeneration
-                    gen = DataGeneration(log=log, out_dir=data_dir)
-
-                    start_time = datetime.now()
-                    
-                    log("Getting ASNs")
-                    asn_table = gen.get_asns()
-                    rt_progress.update(task_id=rt_job_id, advance=1)
-                    log("Selecting ASNs")
-                    selected_asns = gen.random_asns(
-                        asn_table=asn_table, asns_to_select=1000
-                    )
-                    rt_progress.update(task_id=rt_job_id, advance=1)
-                    log("Building Route Table")
-                    gen.make_route_table(asns=selected_asns)
-                    rt_progress.update(task_id=rt_job_id, advance=1)
-                    log("Building Server Table")
-                    gen.build_server_ip_table(
-                        from_ip=gen.SERVER_RANGE[0], to_ip=gen.SERVER_RANGE[1]
-                    )
-                    rt_progress.update(task_id=rt_job_id, advance=1)
-                    gen.log("Generating Flow Data")
-                    total_flows_made, total_sampled_flows_made = gen.generate_data(
-                        flows_to_make=total_flows_to_make,
-                        flows_per_ms=flows_per_ms,
-                        job_progress=job_progress,
-                        job_task=cd_job_id,
-                        sampling_rate=args.sampling_rate,
-                    )
-                    job_progress.update(task_id=cd_job_id, advance=total_flows_to_make)
-                    
-                    end = (datetime.now() - start_time)
-                    gen_minutes = divmod(end.seconds, 60)
-                    
-                if not args.no_reports:
-                    from graph import Graphing
-                    reports = Graphing(output_dir=data_dir, log=log)
-                    
-                    start_time = datetime.now()
-                    reports.genrate_reports(
-                        genrate_peering_report=args.peering_report, 
-                        topn=args.topN, 
-                        report_gen_progress=report_gen_progress, 
-                        report_gen_job_id=report_gen_job_id
-                    )
-                    end = (datetime.now() - start_time)
-                    report_minutes = divmod(end.seconds, 60)
-                                    
-                total_end = (datetime.now() - total_start_time)
-                total_minutes = divmod(total_end.seconds, 60)
+            with Live(layout, refresh_per_second=4, screen=True):
+                stats = run(
+                    args,
+                    log,
+                    data_dir,
+                    total_flows_to_make,
+                    flows_per_ms,
+                    rt_progress=rt_progress,
+                    rt_job_id=rt_job_id,
+                    job_progress=job_progress,
+                    cd_job_id=cd_job_id,
+                    report_gen_progress=report_gen_progress,
+                    report_gen_job_id=report_gen_job_id,
+                )
+                total_minutes = elapsed_minutes(total_start_time)
                 
                 info_table.add_row("Completed at:", f"{datetime.now(timezone.utc)}")
                 info_table.add_row("Elapsed time:", f"{total_minutes[0]} minutes, {total_minutes[1]} seconds")
@@ -391,61 +495,17 @@ if __name__ == "__main__":
             log(f"Keyboard interrupt: {e}")
     
     else:
-        if not args.reports_only:
-            from data_gen import DataGeneration
-            gen = DataGeneration(log=log, out_dir=data_dir)
-
-            start_time = datetime.now()
-            
-            log("Getting ASNs")
-            asn_table = gen.get_asns()
-            log("Selecting ASNs")
-            selected_asns = gen.random_asns(
-                asn_table=asn_table, asns_to_select=1000
-            )
-            log("Building Route Table")
-            gen.make_route_table(asns=selected_asns)
-            log("Building Server Table")
-            gen.build_server_ip_table(
-                from_ip=gen.SERVER_RANGE[0], to_ip=gen.SERVER_RANGE[1]
-            )
-            gen.log("Generating Flow Data")
-            total_flows_made, total_sampled_flows_made = gen.generate_data(
-                flows_to_make=total_flows_to_make,
-                flows_per_ms=flows_per_ms,
-                job_progress=job_progress,
-                job_task=cd_job_id,
-                sampling_rate=args.sampling_rate,
-            )
-            
-            end = (datetime.now() - start_time)
-            gen_minutes = divmod(end.seconds, 60)
-            
-        if not args.no_reports:
-            from graph import Graphing
-            reports = Graphing(output_dir=data_dir, log=log)
-            
-            start_time = datetime.now()
-            reports.genrate_reports(
-                genrate_peering_report=args.peering_report, 
-                topn=args.topN, 
-                report_gen_progress=report_gen_progress, 
-                report_gen_job_id=report_gen_job_id
-            )
-            end = (datetime.now() - start_time)
-            report_minutes = divmod(end.seconds, 60)
-                            
-        total_end = (datetime.now() - total_start_time)
-        total_minutes = divmod(total_end.seconds, 60)
+        stats = run(args, log, data_dir, total_flows_to_make, flows_per_ms)
+        total_minutes = elapsed_minutes(total_start_time)
                 
     
     print(f"Done!")
     print(f"Total Time Taken: {total_minutes[0]} minutes, {total_minutes[1]} seconds")
     
     if not args.reports_only:
-        print(f"Total raw flows made: {total_flows_made}")
-        print(f"Total sampled flows made: {total_sampled_flows_made}")
-        print(f"Time taken to genrate flows: {gen_minutes[0]} minutes, {gen_minutes[1]} seconds")
+        print(f"Total raw flows made: {stats['total_flows_made']}")
+        print(f"Total sampled flows made: {stats['total_sampled_flows_made']}")
+        print(f"Time taken to genrate flows: {stats['gen_minutes'][0]} minutes, {stats['gen_minutes'][1]} seconds")
         
     if not args.no_reports:
-        print(f"Time taken to make reports: {report_minutes[0]} minutes, {report_minutes[1]} seconds")
\ No newline at end of file
+        print(f"Time taken to make reports: {stats['report_minutes'][0]} minutes, {stats['report_minutes'][1]} seconds")
\ No newline at end of file
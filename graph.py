@@ -15,16 +15,23 @@ __license__ = "UNLICENSED/NOLICENSE - Private"
 __status__ = "Development"
 __version__ = "0.0.1"
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import plotly.graph_objects as go
 import plotly.express as px
 import plotly.io as pio 
 import os.path
 import errno
-from random import randrange, choices
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from multiprocessing import get_context
+from numba import get_num_threads, njit, prange
 from typing import (
     BinaryIO,
     Dict,
+    Iterator,
     List,
     Optional,
     TextIO,
@@ -32,13 +39,102 @@ from typing import (
     TypedDict,
 )
 
-# Kaleido Engine Setup
-pio.kaleido.scope.default_format = "png"
+@lru_cache(maxsize=1)
+def _ensure_kaleido() -> None:
+    """Start the Kaleido engine the first time an image is written.
 
-# Poltly Image Setup
-fig = go.Figure()
-fig.to_image(format="png", engine="kaleido")
-# fig.write_image("images/fig1.png")
+    Cached so the warmed up engine is reused by every later image.
+    """
+    # Kaleido Engine Setup
+    pio.kaleido.scope.default_format = "png"
+
+    # Poltly Image Setup
+    fig = go.Figure()
+    fig.to_image(format="png", engine="kaleido")
+
+# Milliseconds in a minute, the reports are binned on the minute
+_MINUTE_MS: int = 60_000
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _bin_sum(groups, bins, values, sums, counts):
+    """Sum the flows of each group into per minute bins in one pass.
+
+    Each column is summed on its own thread so no two threads add to
+    the same bin.
+
+    Args:
+        groups (np.ndarray): The group of each flow
+        bins (np.ndarray): The minute of each flow from the first minute
+        values (np.ndarray): (flows, columns) float64 values to sum
+        sums (np.ndarray): (groups, minutes, columns) zeroed array the sums are added to
+        counts (np.ndarray): (groups, minutes) zeroed array the flow counts are added to
+    """
+    for c in prange(values.shape[1]):
+        for i in range(groups.shape[0]):
+            sums[groups[i], bins[i], c] += values[i, c]
+            if c == 0:
+                counts[groups[i], bins[i]] += 1
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _group_min_max_sum(groups, values, n_groups, n_chunks):
+    """Get the min, max, sum and count of the values of each group in one pass.
+
+    The flows are split into `n_chunks` chunks reduced in parallel, each
+    into its own row of partials that are then combined. NaN values are
+    skipped, as pandas does, a group with none left has a NaN min and max.
+
+    Args:
+        groups (np.ndarray): The dense group code of each flow
+        values (np.ndarray): The float64 value of each flow
+        n_groups (int): The number of groups
+        n_chunks (int): The number of chunks to reduce in parallel
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: The min, max, sum and count of each group
+    """
+    n = groups.shape[0]
+    chunk = (n + n_chunks - 1) // n_chunks
+    mins = np.full((n_chunks, n_groups), np.inf)
+    maxs = np.full((n_chunks, n_groups), -np.inf)
+    sums = np.zeros((n_chunks, n_groups))
+    counts = np.zeros((n_chunks, n_groups), dtype=np.int64)
+    for c in prange(n_chunks):
+        for i in range(c * chunk, min((c + 1) * chunk, n)):
+            g = groups[i]
+            v = values[i]
+            if np.isnan(v):
+                continue
+            if v < mins[c, g]:
+                mins[c, g] = v
+            if v > maxs[c, g]:
+                maxs[c, g] = v
+            sums[c, g] += v
+            counts[c, g] += 1
+    
+    mn = mins[0].copy()
+    mx = maxs[0].copy()
+    sm = sums[0].copy()
+    count = counts[0].copy()
+    for c in range(1, n_chunks):
+        for g in range(n_groups):
+            mn[g] = min(mn[g], mins[c, g])
+            mx[g] = max(mx[g], maxs[c, g])
+            sm[g] += sums[c, g]
+            count[g] += counts[c, g]
+    for g in range(n_groups):
+        if count[g] == 0:
+            mn[g] = np.nan
+            mx[g] = np.nan
+    return mn, mx, sm, count
+
+class LineReport(TypedDict):
+    """A Typing object for a line graph report to be saved."""
+
+    df: pd.DataFrame
+    png_filename: str
+    csv_filename: str
+    title: str
+    color: str
 
 class Graphing:
     """Genrate graphs showing the effect of sampled flows"""
@@ -47,17 +143,51 @@ class Graphing:
     output_dir: str = ""
     raw_flow_file_path: str = ""
     sampled_flow_file_path: str = ""
+    LINE_REPORT_WORKERS: int = 6  # Most processes saving line reports, each starts its own Chromium
+    PEER_PAIR_MERGE_CHUNKS: int = 16  # Chunks of distinct peer pairs held before they are deduped together
+    # In the generator's file order, the pyarrow reader keeps this order rather than the file's
+    flow_columns: List[str] = [
+        "timestamp", 
+        "srcaddr", 
+        "dstaddr", 
+        "dOctets",
+        "first",
+        "last",
+        "src_as", 
+        "dst_as", 
+    ]
+    # The widths the generator writes them with
+    flow_dtypes: Dict[str, str] = {
+        "timestamp": "uint64",
+        "srcaddr": "uint32",
+        "dstaddr": "uint32",
+        "dOctets": "uint32",
+        "first": "uint64",
+        "last": "uint64",
+        "src_as": "uint16",
+        "dst_as": "uint16",
+    }
     
-    def __init__(self, log, output_dir: str = "") -> None:
+    def __init__(self, log, output_dir: str = "", binary: bool = False, seed: Optional[int] = None) -> None:
         """Init graphing class instance.
         Args:
             log: Logging function
             output_dir (Optional[str]): The directory where graphes should be written. Defaults to curent directory.
+            binary (bool): Read the binary flow files instead of the CSVs. Defaults to False.
+            seed (Optional[int]): Seed for the query flow and transit draws, random when not set. Defaults to None.
         """
         self.log = log
         self.output_dir = output_dir
+        self.binary = binary
+        # The same generator as the flow generator so --seed makes the reports reproducible too
+        self.rng = np.random.Generator(np.random.PCG64DXSM(seed))
+        if binary:
+            self.raw_flow_csv = "raw_flow.bin"
+            self.sampled_flow_csv = "sampled_flow.bin"
         self.raw_flow_file_path = f"{self.output_dir}/{self.raw_flow_csv}"
         self.sampled_flow_file_path = f"{self.output_dir}/{self.sampled_flow_csv}"
+        # Set once the data files have been found, they are only looked for once
+        self._files_checked: bool = False
         pd.options.mode.copy_on_write = True
     
     def ip_int_to_string(self, ip: int) -> str:
@@ -72,6 +202,21 @@ class Graphing:
         
         return ip_str
     
+    def ips_to_strings(self, ips: np.ndarray) -> np.ndarray:
+        """Convert an array of IP integers to string format
+        Args:
+            ips (np.ndarray): The IP integers
+        Returns:
+            np.ndarray: The IP strings
+        """
+        # Each address viewed as its four big endian bytes, every octet is formatted in one pass
+        octets: np.ndarray = ips.astype(">u4").view(np.uint8).reshape(-1, 4)
+        ip_strs: np.ndarray = octets[:, 0].astype(str)
+        for i in range(1, 4):
+            ip_strs = np.char.add(np.char.add(ip_strs, "."), octets[:, i].astype(str))
+        
+        return ip_strs
+    
     def get_unit_size(self, max_unit: int) -> Tuple[int, str]:
         div = 1000
         unit = "bps"
@@ -98,6 +243,8 @@ class Graphing:
         Returns:
             bool: True if successful, False otherwise
         """
+        if self._files_checked:
+            return True
         rc: bool = True if (len(self.output_dir) == 0) or (os.path.isdir(f"{self.output_dir}")) else False
         if not rc:
             filename = f"{self.output_dir} Directory Not Found"
@@ -112,8 +259,94 @@ class Graphing:
             raise FileNotFoundError(
                 errno.ENOENT, os.strerror(errno.ENOENT), filename)
         
+        self._files_checked = rc
         return rc
     
+    def read_flows(self, path: str) -> pd.DataFrame:
+        """Read only the columns the reports use from a flows file.
+        Args:
+            path (str): The flows file to read
+        Returns:
+            pd.DataFrame: The flows with each flow's bps and the timestamp as a datetime
+        """
+        df: pd.DataFrame
+        # The parsed CSV is kept as Parquet beside it, reused until the CSV is rewritten
+        parquet_path: str = f"{os.path.splitext(path)[0]}.parquet"
+        if self.binary:
+            from data_gen import read_flows
+            df = read_flows(path, self.flow_columns)
+        elif os.path.isfile(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            df = pd.read_parquet(parquet_path, engine="pyarrow", columns=self.flow_columns)
+        else:
+            df = pd.read_csv(
+                path,
+                header=0,
+                usecols=self.flow_columns,
+                dtype=self.flow_dtypes,
+                engine="pyarrow",
+            )
+            try:
+                df.to_parquet(parquet_path, engine="pyarrow", compression="snappy", index=False)
+            except OSError as e:
+                self.log(f'Unable to cache {path} as {parquet_path}: {e}')
+        # Every report uses the flow rate and time so they are worked out once here
+        df["bps"] = self.flow_bps(df)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        return df
+    
+    def flow_bps(self, df: pd.DataFrame) -> np.ndarray:
+        """Work out the rate of each flow
+        Args:
+            df (pd.DataFrame): The flows, with their dOctets, last and first
+        Returns:
+            np.ndarray: The bps of each flow
+        """
+        # The rate overwrites the float durations in place, so the array is the only temporary
+        bps: np.ndarray = np.subtract(df["last"].to_numpy(), df["first"].to_numpy(), dtype=np.float64)
+        # Same inf and NaN as pandas gives a zero length flow, without the warning
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.true_divide(df["dOctets"].to_numpy(), bps, out=bps)
+        return bps
+    
+    def iter_flows(self, path: str, columns: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+        """Read a flows file a chunk of flows at a time.
+        Args:
+            path (str): The flows file to read
+            columns (List[str]): The columns to read
+            chunksize (int): The most flows in a chunk
+        Returns:
+            Iterator[pd.DataFrame]: The chunks of flows, each with its flows' bps when their dOctets, first and last are read
+        """
+        chunks: Iterator[pd.DataFrame]
+        parquet_path: str = f"{os.path.splitext(path)[0]}.parquet"
+        if self.binary:
+            from data_gen import FLOW_DTYPE
+            # Mapped rather than read so only the chunk being worked on is paged in
+            flows: np.ndarray = np.memmap(path, dtype=FLOW_DTYPE, mode="r") if os.path.getsize(path) else np.empty(0, dtype=FLOW_DTYPE)
+            chunks = (
+                pd.DataFrame({column: np.ascontiguousarray(flows[start:start + chunksize][column]) for column in columns})
+                for start in range(0, flows.shape[0], chunksize)
+            )
+        elif os.path.isfile(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(path):
+            import pyarrow.parquet as pq
+            chunks = (
+                batch.to_pandas()
+                for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunksize, columns=columns)
+            )
+        else:
+            chunks = pd.read_csv(
+                path,
+                header=0,
+                usecols=columns,
+                dtype={column: self.flow_dtypes[column] for column in columns},
+                chunksize=chunksize,
+            )
+        with_bps: bool = {"dOctets", "first", "last"} <= set(columns)
+        for chunk in chunks:
+            if with_bps:
+                chunk["bps"] = self.flow_bps(chunk)
+            yield chunk
+    
     def load_raw_flows(self) -> bool:
         """ Load the raw flows CSV file into a pandas dataframe. 
         Args:
@@ -123,20 +356,7 @@ class Graphing:
         rc: bool = self.check_for_data_files()
         if rc:
             try:
-                self.raw_flow_df = pd.read_csv(
-                    self.raw_flow_file_path,
-                    header=0,
-                    usecols=[
-                        "timestamp", 
-                        "srcaddr", 
-                        "dstaddr", 
-                        "src_as", 
-                        "dst_as", 
-                        "dOctets",
-                        "last",
-                        "first",
-                    ]
-                )
+                self.raw_flow_df = self.read_flows(self.raw_flow_file_path)
                 if self.raw_flow_df.empty:
                     rc = False
                     raise RuntimeError('CSV is empty')
@@ -153,20 +373,7 @@ class Graphing:
         rc: bool = self.check_for_data_files()
         if rc:
             try:
-                self.sampled_flow_df = pd.read_csv(
-                    self.sampled_flow_file_path,
-                    header=0,
-                    usecols=[
-                        "timestamp", 
-                        "srcaddr", 
-                        "dstaddr", 
-                        "src_as", 
-                        "dst_as", 
-                        "dOctets",
-                        "last",
-                        "first",
-                    ]
-                )
+                self.sampled_flow_df = self.read_flows(self.sampled_flow_file_path)
                 if self.sampled_flow_df.empty:
                     rc = False
                     raise RuntimeError('CSV is empty')
@@ -174,48 +381,179 @@ class Graphing:
                 self.log(f'There was an error in {self.sampled_flow_file_path} input: {e}')
         return rc
         
-    def select_random_flows(self) -> Tuple[List[int], List[int]]:
+    def query_flow_counts(self, df: pd.DataFrame) -> pd.Series:
+        """Count the flows of each source address of the peer ASs
+        args:
+            df (pd.DataFrame): The flows, with their src_as and srcaddr
+        Returns:
+            pd.Series: The flow counts indexed by src_as and srcaddr
+        """
+        return df.loc[df["src_as"].to_numpy() < 64000].groupby(["src_as", "srcaddr"]).size()
+    
+    def stream_query_flow_counts(self, path: str, chunksize: int = 1_000_000) -> pd.Series:
+        """Count the flows of each source address of the peer ASs in a flows file a chunk at a time
+        args:
+            path (str): The flows file to count
+            chunksize (int): The most flows read at once. Defaults to 1,000,000.
+        Returns:
+            pd.Series: The flow counts indexed by src_as and srcaddr
+        """
+        counts: List[pd.Series] = [
+            self.query_flow_counts(chunk)
+            for chunk in self.iter_flows(path, ["srcaddr", "src_as"], chunksize)
+        ]
+        if not counts:
+            return pd.Series([], index=pd.MultiIndex.from_arrays([[], []], names=["src_as", "srcaddr"]), dtype=np.int64)
+        return pd.concat(counts).groupby(level=["src_as", "srcaddr"]).sum()
+    
+    def stream_query_flows(self, path: str, address_queries: List[int], as_queries: List[int], chunksize: int = 1_000_000) -> pd.DataFrame:
+        """Read only the flows of the query addresses and ASs from a flows file a chunk at a time
+        args:
+            path (str): The flows file to read
+            address_queries (List[int]): The source addresses to keep the flows of
+            as_queries (List[int]): The source ASs to keep the flows of
+            chunksize (int): The most flows read at once. Defaults to 1,000,000.
+        Returns:
+            pd.DataFrame: The query flows as `read_flows` gives them
+        """
+        query_chunks: List[pd.DataFrame] = [
+            chunk.loc[np.isin(chunk["srcaddr"].to_numpy(), address_queries) | np.isin(chunk["src_as"].to_numpy(), as_queries)]
+            for chunk in self.iter_flows(path, self.flow_columns, chunksize)
+        ]
+        df: pd.DataFrame = pd.concat(query_chunks, ignore_index=True)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+        return df
+        
+    def select_random_flows(self, counts: Optional[pd.Series] = None) -> Tuple[List[int], List[int]]:
         """Select three random flows from the raw flow dataframe to be used in queries
         args:
+            counts (Optional[pd.Series]): The raw flows' `query_flow_counts`, worked out from the raw flow dataframe when not given. Defaults to None.
         Returns:
-            Tuple[List[int], List[int]]: A list of srcaddres and src_as if successful, false otherwise
+            Tuple[List[int], List[int]]: A list of srcaddres and src_as if successful, empty lists otherwise
         """
-        index: List[int] = [0] * 3
         addr: List[int] = [0] * 3
         asn: List[int] = [0] * 3
         
-        q: pd.Series = self.raw_flow_df.query("src_as < 64000").value_counts("src_as").nlargest(10)
-        if q.shape[0] > 3:
-            for i in range(0, 3):
-                while True:
-                    _index: int = randrange(0, q.shape[0])
-                    # Check if we alrady have this index in our list
-                    if _index not in index:
-                        asn[i] = q.index[_index]
-                        _q: pd.Series = self.raw_flow_df.query(f"src_as == {q.index[_index]}").value_counts("srcaddr").nlargest(1)
-                        addr[i] = _q.index[0].item()
-                        break
-        else:
-            index = False
+        # Flows per source address within each AS, one pass over the flows serves every pick
+        if counts is None:
+            counts = self.query_flow_counts(self.raw_flow_df)
+        q: pd.Series = counts.groupby(level="src_as").sum().nlargest(10)
+        if q.shape[0] < 3:
+            return ([], [])
+        # Three distinct ASs from the top ten
+        for i, _index in enumerate(self.rng.choice(q.shape[0], size=3, replace=False).tolist()):
+            asn[i] = q.index[_index].item()
+            _q: pd.Series = counts.loc[q.index[_index]].nlargest(1)
+            addr[i] = _q.index[0].item()
             
         return (addr, asn)
         
-    def agg_df(self, df: pd.DataFrame, query_str: str) -> pd.DataFrame:
-        """Get an agraggated dataframe of the raw flow dataframe
+    def agg_dfs(self, df: pd.DataFrame, key: str, values: List[int]) -> List[pd.DataFrame]:
+        """Get an agraggated dataframe per value of a column, all from one grouping
         args:
-            query_str (str): The query string to apply to the dataframe
+            df (pd.DataFrame): The flows dataframe to aggregate
+            key (str): The column to select flows by
+            values (List[int]): The values of `key` to aggregate
         Returns:
-            pd.DataFrame: A dataframe of the raw flow dataframe
+            List[pd.DataFrame]: A per minute dataframe for each value, in the order of `values`
         """
-        agg_df: pd.DataFrame = df.query(query_str)
-        agg_df["bps"] = agg_df["dOctets"] / (agg_df["last"] - agg_df["first"])
-    
-        agg_df["timestamp"] = pd.to_datetime(agg_df["timestamp"], unit="ms")
-        agg_df.set_index("timestamp", inplace=True)
+        agg_df: pd.DataFrame = df.loc[np.isin(df[key].to_numpy(), values)]
+        columns: List[str] = agg_df.columns.tolist()
+        columns.remove("timestamp")
+        
+        # Every value's flows are binned by minute together, the values take the first axis
+        keys: np.ndarray = np.unique(values)
+        minute: np.ndarray = agg_df["timestamp"].to_numpy(dtype="datetime64[ms]").view(np.int64) // _MINUTE_MS
+        t0_bin: int = minute.min() if minute.shape[0] else 0
+        n_bins: int = minute.max() - t0_bin + 1 if minute.shape[0] else 0
+        sums: np.ndarray = np.zeros((keys.shape[0], n_bins, len(columns)), dtype=np.float64)
+        counts: np.ndarray = np.zeros((keys.shape[0], n_bins), dtype=np.int64)
+        _bin_sum(
+            np.searchsorted(keys, agg_df[key].to_numpy()),
+            minute - t0_bin,
+            agg_df[columns].to_numpy(dtype=np.float64),
+            sums,
+            counts,
+        )
     
-        agg_df = agg_df.resample("1min").mean().reset_index()
+        agg_dfs: List[pd.DataFrame] = []
+        for value in values:
+            group: int = np.searchsorted(keys, value)
+            seen: np.ndarray = np.flatnonzero(counts[group])
+            if seen.shape[0]:
+                # From the value's first to last minute, the empty minutes in between are left NaN
+                first, last = seen[0], seen[-1] + 1
+                with np.errstate(invalid="ignore"):
+                    means: np.ndarray = sums[group, first:last] / counts[group, first:last, None]
+                per_minute: pd.DataFrame = pd.DataFrame(means, columns=columns)
+                per_minute.insert(0, "timestamp", pd.to_datetime((np.arange(first, last) + t0_bin) * _MINUTE_MS, unit="ms"))
+            else:
+                per_minute = pd.DataFrame(columns=["timestamp"] + columns)
+            agg_dfs.append(per_minute)
     
-        return agg_df
+        return agg_dfs
+        
+    def peer_partials(self, peer_as: pd.Series, bps: pd.Series) -> pd.DataFrame:
+        """Get the min, max, sum and count of the bps of each AS on one side of the flows
+        Args:
+            peer_as (pd.Series): The AS of each flow
+            bps (pd.Series): The bps of each flow
+        Returns:
+            pd.DataFrame: The min, max, sum and count columns indexed by AS
+        """
+        # Kept as sums and counts so the partials of several chunks can be combined
+        codes, asns = pd.factorize(peer_as, sort=False)
+        mn, mx, sm, count = _group_min_max_sum(
+            codes,
+            bps.to_numpy(dtype=np.float64),
+            asns.shape[0],
+            get_num_threads(),
+        )
+        
+        return pd.DataFrame(
+            {"min": mn, "max": mx, "sum": sm, "count": count},
+            index=pd.Index(asns, name="as"),
+        )
+        
+    def peer_rates(self, partials: pd.DataFrame, side: str) -> pd.DataFrame:
+        """Get the mean, min and max bps of each AS from its partials
+        Args:
+            partials (pd.DataFrame): The min, max, sum and count columns indexed by AS
+            side (str): The side the columns are named for, src or dst
+        Returns:
+            pd.DataFrame: The side's bps, bps_min and bps_max columns indexed by AS
+        """
+        count: np.ndarray = partials["count"].to_numpy()
+        mean: np.ndarray = np.full(count.shape[0], np.nan)
+        np.divide(partials["sum"].to_numpy(), count, out=mean, where=count > 0)
+        
+        return pd.DataFrame(
+            {f"{side}_bps": mean, f"{side}_bps_min": partials["min"].to_numpy(), f"{side}_bps_max": partials["max"].to_numpy()},
+            index=partials.index,
+        )
+        
+    def unique_addresses(self, peer_as: np.ndarray, peer_address: np.ndarray) -> pd.DataFrame:
+        """Count the unique addresses of each AS
+        Args:
+            peer_as (np.ndarray): The AS of each address
+            peer_address (np.ndarray): The addresses
+        Returns:
+            pd.DataFrame: The address column indexed by AS
+        """
+        # Sorted by AS then address, an address is new where either changes from the row before
+        order: np.ndarray = np.lexsort((peer_address, peer_as))
+        as_sorted: np.ndarray = peer_as[order]
+        address_sorted: np.ndarray = peer_address[order]
+        new_as: np.ndarray = np.ones(order.shape[0], dtype=bool)
+        np.not_equal(as_sorted[1:], as_sorted[:-1], out=new_as[1:])
+        new_address: np.ndarray = new_as.copy()
+        new_address[1:] |= address_sorted[1:] != address_sorted[:-1]
+        as_starts: np.ndarray = np.flatnonzero(new_as)
+        
+        return pd.DataFrame(
+            {"address": np.add.reduceat(new_address, as_starts, dtype=np.int64)},
+            index=pd.Index(as_sorted[as_starts]),
+        )
         
     def peering_report(self, df: pd.DataFrame, topn: int) -> pd.DataFrame:
         """Generate a peering report for a dataframe
@@ -225,53 +563,99 @@ class Graphing:
         Returns:
             pd.DataFrame: A dataframe of the peering report
         """
+        # Each side's peer flows are picked out once and used for both the rates and the addresses
+        src_mask: np.ndarray = df["src_as"].to_numpy() < 64000
+        dst_mask: np.ndarray = df["dst_as"].to_numpy() < 64000
+        src_flows: pd.DataFrame = df.loc[src_mask, ["src_as", "srcaddr", "bps"]]
+        dst_flows: pd.DataFrame = df.loc[dst_mask, ["dst_as", "dstaddr", "bps"]]
         
-        df["bps"] = df["dOctets"] / (df["last"] - df["first"])
+        # One fused pass per side, the AS keys are encoded once and bps streamed once
+        src_rates: pd.DataFrame = self.peer_rates(self.peer_partials(peer_as=src_flows["src_as"], bps=src_flows["bps"]), side="src")
+        dst_rates: pd.DataFrame = self.peer_rates(self.peer_partials(peer_as=dst_flows["dst_as"], bps=dst_flows["bps"]), side="dst")
         
-        src_asns_dOctets_: pd.DataFrame = df[["src_as", "bps"]].query("src_as < 64000")
-        src_asns_dOctets_min: pd.DataFrame = src_asns_dOctets_.groupby("src_as").min()
-        src_asns_dOctets_max: pd.DataFrame = src_asns_dOctets_.groupby("src_as").max()
-        src_asns_dOctets: pd.DataFrame = src_asns_dOctets_.groupby("src_as").mean()
+        # Unique addresses seen on either side of each AS, the two sides are stacked as plain
+        # arrays rather than renamed frames
+        peer_as: np.ndarray = np.concatenate([src_flows["src_as"].to_numpy(), dst_flows["dst_as"].to_numpy()])
+        peer_address: np.ndarray = np.concatenate([src_flows["srcaddr"].to_numpy(), dst_flows["dstaddr"].to_numpy()])
+        asns_adders: pd.DataFrame = self.unique_addresses(peer_as=peer_as, peer_address=peer_address)
         
-        dst_asns_dOctets_: pd.DataFrame = df[["dst_as", "bps"]].query("dst_as < 64000")
-        dst_asns_dOctets_min: pd.DataFrame = dst_asns_dOctets_.groupby("dst_as").min()
-        dst_asns_dOctets_max: pd.DataFrame = dst_asns_dOctets_.groupby("dst_as").max()
-        dst_asns_dOctets: pd.DataFrame = dst_asns_dOctets_.groupby("dst_as").mean()
-        
-        src_asns_adders: pd.DataFrame = df[["src_as", "srcaddr"]].query("src_as < 64000")
-        dst_asns_adders: pd.DataFrame = df[["dst_as", "dstaddr"]].query("dst_as < 64000")
-        
-        src_asns_dOctets.rename(columns={"src_as": "as", "bps": "src_bps"}, inplace=True)
-        src_asns_dOctets_min.rename(columns={"src_as": "as", "bps": "src_bps_min"}, inplace=True)
-        src_asns_dOctets_max.rename(columns={"src_as": "as", "bps": "src_bps_max"}, inplace=True)
-        
-        dst_asns_dOctets.rename(columns={"dst_as": "as", "bps": "dst_bps"}, inplace=True)
-        dst_asns_dOctets_min.rename(columns={"dst_as": "as", "bps": "dst_bps_min"}, inplace=True)
-        dst_asns_dOctets_max.rename(columns={"dst_as": "as", "bps": "dst_bps_max"}, inplace=True)
-        
-        src_asns_adders.rename(columns={"src_as": "as", "srcaddr": "address"}, inplace=True)
-        dst_asns_adders.rename(columns={"dst_as": "as", "dstaddr": "address"}, inplace=True)
+        return self.assemble_peering_report(src_rates=src_rates, dst_rates=dst_rates, asns_adders=asns_adders, topn=topn)
+    
+    def stream_peering_report(self, path: str, topn: int, chunksize: int = 1_000_000) -> pd.DataFrame:
+        """Generate a peering report from a flows file a chunk at a time
+        Args: 
+            path (str): The flows file to generate a peering report for
+            topn (int): The number of top peers to show
+            chunksize (int): The most flows read at once. Defaults to 1,000,000.
+        Returns:
+            pd.DataFrame: A dataframe of the peering report
+        """
+        src_partials: List[pd.DataFrame] = []
+        dst_partials: List[pd.DataFrame] = []
+        # Each (AS, address) pair packed in to one integer, only each chunk's distinct pairs are held
+        peer_pairs: List[np.ndarray] = []
+        for chunk in self.iter_flows(path, ["srcaddr", "dstaddr", "src_as", "dst_as", "dOctets", "last", "first"], chunksize):
+            src_flows: pd.DataFrame = chunk.loc[chunk["src_as"].to_numpy() < 64000]
+            dst_flows: pd.DataFrame = chunk.loc[chunk["dst_as"].to_numpy() < 64000]
+            src_partials.append(self.peer_partials(peer_as=src_flows["src_as"], bps=src_flows["bps"]))
+            dst_partials.append(self.peer_partials(peer_as=dst_flows["dst_as"], bps=dst_flows["bps"]))
+            peer_pairs.append(np.unique(np.concatenate([
+                (src_flows["src_as"].to_numpy().astype(np.uint64) << np.uint64(32)) | src_flows["srcaddr"].to_numpy(),
+                (dst_flows["dst_as"].to_numpy().astype(np.uint64) << np.uint64(32)) | dst_flows["dstaddr"].to_numpy(),
+            ])))
+            # The held pairs are deduped every so many chunks rather than re-sorted on every one
+            if len(peer_pairs) == self.PEER_PAIR_MERGE_CHUNKS:
+                peer_pairs = [np.unique(np.concatenate(peer_pairs))]
         
-        asns_adders: pd.DataFrame = pd.concat([src_asns_adders, dst_asns_adders]).groupby("as").nunique()
-        del src_asns_adders, dst_asns_adders
+        # The chunks' partials are combined per AS before the means are taken
+        src_rates: pd.DataFrame = self.peer_rates(self.merge_peer_partials(src_partials), side="src")
+        dst_rates: pd.DataFrame = self.peer_rates(self.merge_peer_partials(dst_partials), side="dst")
+        distinct_pairs: np.ndarray = np.unique(np.concatenate(peer_pairs)) if peer_pairs else np.empty(0, dtype=np.uint64)
+        peer_as, address_counts = np.unique(distinct_pairs >> np.uint64(32), return_counts=True)
+        asns_adders: pd.DataFrame = pd.DataFrame(
+            {"address": address_counts},
+            index=pd.Index(peer_as.astype(self.flow_dtypes["src_as"])),
+        )
         
-        asns: pd.DataFrame = pd.concat([
-            src_asns_dOctets, 
-            src_asns_dOctets_min, 
-            src_asns_dOctets_max, 
-            dst_asns_dOctets,
-            dst_asns_dOctets_min, 
-            dst_asns_dOctets_max, 
-            asns_adders, 
-        ], join="outer", axis=1)
+        return self.assemble_peering_report(src_rates=src_rates, dst_rates=dst_rates, asns_adders=asns_adders, topn=topn)
+    
+    def merge_peer_partials(self, partials: List[pd.DataFrame]) -> pd.DataFrame:
+        """Combine the per AS partials of several chunks
+        Args:
+            partials (List[pd.DataFrame]): The min, max, sum and count columns indexed by AS of each chunk
+        Returns:
+            pd.DataFrame: The combined min, max, sum and count columns indexed by AS
+        """
+        if not partials:
+            return pd.DataFrame({"min": [], "max": [], "sum": [], "count": []}, index=pd.Index([], name="as"))
+        return pd.concat(partials).groupby(level="as").agg({"min": "min", "max": "max", "sum": "sum", "count": "sum"})
+    
+    def assemble_peering_report(self, src_rates: pd.DataFrame, dst_rates: pd.DataFrame, asns_adders: pd.DataFrame, topn: int) -> pd.DataFrame:
+        """Join the per AS rates and address counts into a peering report
+        Args: 
+            src_rates (pd.DataFrame): The src_bps, src_bps_min and src_bps_max columns indexed by AS
+            dst_rates (pd.DataFrame): The dst_bps, dst_bps_min and dst_bps_max columns indexed by AS
+            asns_adders (pd.DataFrame): The address column indexed by AS
+            topn (int): The number of top peers to show
+        Returns:
+            pd.DataFrame: A dataframe of the peering report
+        """
+        # The sides and addresses are hash joined on the AS
+        asns: pd.DataFrame = src_rates.rename_axis("as").reset_index().merge(
+            dst_rates.rename_axis("as").reset_index(), on="as", how="outer"
+        ).merge(
+            asns_adders.rename_axis("as").reset_index(), on="as", how="outer"
+        )
         
-        asns["transit"] = pd.Series(choices(["Transit", "Non-Transit"], weights=[1,1], k=asns.shape[0]), index=asns.index) 
-        asns["total_bandwidth"] = asns["src_bps"] + asns["dst_bps"]
-        asns.index.name = "as"
-        del asns_adders, src_asns_dOctets, dst_asns_dOctets
+        # An even draw per AS held as one byte codes rather than a string object per row
+        asns["transit"] = pd.Categorical.from_codes(
+            self.rng.integers(0, 2, size=asns.shape[0], dtype=np.int8),
+            categories=["Transit", "Non-Transit"],
+        )
+        # An AS only seen on one side still has that side's bandwidth
+        asns["total_bandwidth"] = asns["src_bps"].add(asns["dst_bps"], fill_value=0)
         
-        peering_report: pd.DataFrame = asns.sort_values(by="total_bandwidth", ascending=False).head(topn).reset_index()
-        del asns
+        peering_report: pd.DataFrame = asns.sort_values(by="total_bandwidth", ascending=False).head(topn).reset_index(drop=True)
         peering_report["as"] = peering_report["as"].astype(str)
         
         return peering_report
@@ -289,6 +673,7 @@ class Graphing:
         div, unit = self.get_unit_size(max_unit=max_unit)
         df["bps"] = df["bps"] / div
         try:
+            _ensure_kaleido()
             fig = px.line(
                 df, 
                 x="timestamp", 
@@ -304,13 +689,34 @@ class Graphing:
                 yaxis_ticksuffix=f" {unit}",
             )
             
-            fig.write_image(filename)
+            fig.write_image(filename, engine="kaleido")
             rc = True
         except Exception as e:
             self.log(f'There was an error in {filename} output: {e}')
         
         return rc
     
+    def scale_peering_rates(self, df: pd.DataFrame) -> Tuple[str, str]:
+        """Scale a peering report's rates in place to the units they are charted in.
+        args:
+            df (pd.DataFrame): The peering report to scale
+        Returns:
+            Tuple[str, str]: The unit of the ingress rates, the unit of the egress rates
+        """
+        max_unit: int = df["src_bps"].max()
+        src_div, src_unit = self.get_unit_size(max_unit=max_unit)
+        max_unit = df["dst_bps"].max()
+        dst_div, dst_unit = self.get_unit_size(max_unit=max_unit)
+        
+        # The six rate columns are scaled as one array and assigned back together
+        rate_columns: List[str] = ["src_bps", "src_bps_min", "src_bps_max", "dst_bps", "dst_bps_min", "dst_bps_max"]
+        rates: np.ndarray = df[rate_columns].to_numpy(dtype=np.float64, copy=True)
+        rates[:, 0:3] /= src_div
+        rates[:, 3:6] /= dst_div
+        df[rate_columns] = rates
+        
+        return (src_unit, dst_unit)
+    
     def save_peering_df_as_bubble_chart_png(self, df: pd.DataFrame, filename: str) -> bool:
         """Save a dataframe as a bubble chart png image file.
         args:
@@ -320,19 +726,10 @@ class Graphing:
             bool: True if successful, False otherwise
         """
         rc: bool = False
-        max_unit: int = df["src_bps"].max()
-        src_div, src_unit = self.get_unit_size(max_unit=max_unit)
-        df["src_bps"] = df["src_bps"] / src_div
-        df["src_bps_min"] = df["src_bps_min"] / src_div
-        df["src_bps_max"] = df["src_bps_max"] / src_div
-        
-        max_unit = df["dst_bps"].max()
-        dst_div, dst_unit = self.get_unit_size(max_unit=max_unit)
-        df["dst_bps"] = df["dst_bps"] / dst_div
-        df["dst_bps_min"] = df["dst_bps_min"] / src_div
-        df["dst_bps_max"] = df["dst_bps_max"] / src_div
+        src_unit, dst_unit = self.scale_peering_rates(df)
         
         try:
+            _ensure_kaleido()
             fig = px.scatter(
                 df,
                 x="src_bps",
@@ -359,7 +756,7 @@ class Graphing:
                 xaxis_ticksuffix=f" {src_unit}",
                 yaxis_ticksuffix=f" {dst_unit}",
             )
-            fig.write_image(f"{filename}_a.png")
+            fig.write_image(f"{filename}_a.png", engine="kaleido")
             
             fig = px.scatter(
                 df,
@@ -381,7 +778,7 @@ class Graphing:
                 xaxis_ticksuffix=f" {src_unit}",
                 yaxis_ticksuffix=f" {dst_unit}",
             )
-            fig.write_image(f"{filename}_b.png")
+            fig.write_image(f"{filename}_b.png", engine="kaleido")
 
             rc = True
             
@@ -401,18 +798,36 @@ class Graphing:
         rc: bool = False
         try:
             df.index.name = "id"
-            df.to_csv(filename)
+            # Written by Arrow's C++ writer, the index as the first column as to_csv had it
+            pacsv.write_csv(pa.Table.from_pandas(df.reset_index(), preserve_index=False), filename)
             rc = True
         except Exception as e:
             self.log(f'There was an error in {filename} output: {e}')
         
         return rc
     
-    def genrate_reports(self, genrate_peering_report: bool, report_gen_progress, report_gen_job_id, topn: int = 0) -> bool:
+    def save_line_report(self, report: LineReport) -> bool:
+        """Save a report as a line graph png image file and a csv file.
+        args:
+            report (LineReport): The report to save
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.save_df_as_line_graph_png(
+            df=report["df"], 
+            filename=report["png_filename"], 
+            title=report["title"], 
+            color=report["color"]
+        ):
+            return False
+        return self.save_df_as_csv(df=report["df"], filename=report["csv_filename"])
+    
+    def genrate_reports(self, genrate_peering_report: bool, report_gen_progress, report_gen_job_id, topn: int = 0, stream_peering: bool = False) -> bool:
         """Generate reports
         Args:
             genrate_peering_report (bool): Whether or not to generate peering reports
             topn (int): The number of top peers to show
+            stream_peering (bool): Read the raw flows file in chunks rather than loading it. Defaults to False.
         Returns:
             bool: True if successful, False otherwise
         """
@@ -420,88 +835,86 @@ class Graphing:
         
         if self.check_for_data_files():
             self.log(f"Loading data files")
-            self.load_raw_flows()
-            report_gen_progress.update(task_id=report_gen_job_id, advance=1)
-            self.load_sampled_flows()
-            report_gen_progress.update(task_id=report_gen_job_id, advance=1)
+            if stream_peering:
+                # The raw flows are never held whole, the sampled flows are a fraction of them
+                self.load_sampled_flows()
+                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
+                query_flow_counts: Optional[pd.Series] = self.stream_query_flow_counts(path=self.raw_flow_file_path)
+                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
+            else:
+                # The two files are independent and the pyarrow reader releases the GIL
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    for _ in as_completed([
+                        executor.submit(self.load_raw_flows),
+                        executor.submit(self.load_sampled_flows),
+                    ]):
+                        report_gen_progress.update(task_id=report_gen_job_id, advance=1)
+                query_flow_counts = None
             
             self.log(f"Selecting random flows to be used for queries")
-            address_queries, as_queries = self.select_random_flows()
+            address_queries, as_queries = self.select_random_flows(counts=query_flow_counts)
+            if not as_queries:
+                self.log(f"Not enough ASNs in the raw flows to select query flows from")
+                return False
             report_gen_progress.update(task_id=report_gen_job_id, advance=1)
-            
-            agg_src_as_dfs: List[pd.DataFrame] = [None] * 3
-            agg_src_adders_dfs: List[pd.DataFrame] = [None] * 3
+            if stream_peering:
+                # Only the query flows are needed for the raw line reports
+                self.raw_flow_df = self.stream_query_flows(
+                    path=self.raw_flow_file_path,
+                    address_queries=address_queries,
+                    as_queries=as_queries,
+                )
             
             self.log(f"Generating reports")            
-            for i in range(0, 3):
-                ip: str = self.ip_int_to_string(ip=address_queries[i])
-                self.log(f"Generating reports for IP {ip} from raw flows - {i+1} of 3")
-                agg_src_adders_dfs[i] = self.agg_df(df=self.raw_flow_df, query_str=f"srcaddr == {address_queries[i]}")
-                if not self.save_df_as_line_graph_png(
-                    df=agg_src_adders_dfs[i], 
-                    filename=f"{self.output_dir}raw_flow_line_graph_for_ip_{ip}.png", 
-                    title=f"Traffic for source IP {ip}", 
-                    color="srcaddr"
-                ):
-                    rc = False
-                    break
-                if not self.save_df_as_csv(df=agg_src_adders_dfs[i], filename=f"{self.output_dir}raw_flow_ip_{ip}.csv"):
-                    rc = False
-                    break
-                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
-                                
-            for i in range(0, 3):
-                self.log(f"Generating report for ASN {as_queries[i]} from raw flows - {i+1} of 3")
-                agg_src_as_dfs[i] = self.agg_df(df=self.raw_flow_df, query_str=f"src_as == {as_queries[i]}")
-                if not self.save_df_as_line_graph_png(
-                    df=agg_src_as_dfs[i], 
-                    filename=f"{self.output_dir}raw_flow_line_graph_for_as_{as_queries[i]}.png", 
-                    title=f"Trafic for source ASN {as_queries[i]}", 
-                    color="src_as"
-                ):
-                    rc = False
-                    break
-                if not self.save_df_as_csv(df=agg_src_as_dfs[i], filename=f"{self.output_dir}raw_flow_as_{as_queries[i]}.csv"):
-                    rc = False
-                    break
-                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
-                          
-            for i in range(0, 3):
-                ip: str = self.ip_int_to_string(ip=address_queries[i])
-                self.log(f"Generating reports for IP {ip} from sampled flows - {i+1} of 3")
-                agg_src_adders_dfs[i] = self.agg_df(df=self.sampled_flow_df, query_str=f"srcaddr == {address_queries[i]}")
-                if not self.save_df_as_line_graph_png(
-                    df=agg_src_adders_dfs[i], 
-                    filename=f"{self.output_dir}sampled_flow_line_graph_for_ip_{ip}.png", 
-                    title=f"Traffic for source IP {ip}", 
-                    color="srcaddr"
-                ):
-                    rc = False
-                    break
-                if not self.save_df_as_csv(df=agg_src_adders_dfs[i], filename=f"{self.output_dir}sampled_flow_ip_{ip}.csv"):
-                    rc = False
-                    break
-                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
-                                
-            for i in range(0, 3):
-                self.log(f"Generating report for ASN {as_queries[i]} from sampled flows - {i+1} of 3")
-                agg_src_as_dfs[i] = self.agg_df(df=self.sampled_flow_df, query_str=f"src_as == {as_queries[i]}")
-                if not self.save_df_as_line_graph_png(
-                    df=agg_src_as_dfs[i], 
-                    filename=f"{self.output_dir}sampled_flow_line_graph_for_as_{as_queries[i]}.png", 
-                    title=f"Trafic for source ASN {as_queries[i]}", 
-                    color="src_as"
-                ):
-                    rc = False
-                    break
-                if not self.save_df_as_csv(df=agg_src_as_dfs[i], filename=f"{self.output_dir}sampled_flow_as_{as_queries[i]}.csv"):
-                    rc = False
-                    break
-                report_gen_progress.update(task_id=report_gen_job_id, advance=1)
+            # The three address and three AS reports of each file are each cut from one grouping
+            line_reports: List[LineReport] = []
+            address_strs: List[str] = self.ips_to_strings(np.array(address_queries, dtype=np.uint32)).tolist()
+            for name, flow_df in (("raw", self.raw_flow_df), ("sampled", self.sampled_flow_df)):
+                agg_src_adders_dfs: List[pd.DataFrame] = self.agg_dfs(df=flow_df, key="srcaddr", values=address_queries)
+                for i in range(0, 3):
+                    ip: str = address_strs[i]
+                    self.log(f"Generating reports for IP {ip} from {name} flows - {i+1} of 3")
+                    line_reports.append({
+                        "df": agg_src_adders_dfs[i],
+                        "png_filename": f"{self.output_dir}{name}_flow_line_graph_for_ip_{ip}.png",
+                        "csv_filename": f"{self.output_dir}{name}_flow_ip_{ip}.csv",
+                        "title": f"Traffic for source IP {ip}",
+                        "color": "srcaddr",
+                    })
+                agg_src_as_dfs: List[pd.DataFrame] = self.agg_dfs(df=flow_df, key="src_as", values=as_queries)
+                for i in range(0, 3):
+                    self.log(f"Generating report for ASN {as_queries[i]} from {name} flows - {i+1} of 3")
+                    line_reports.append({
+                        "df": agg_src_as_dfs[i],
+                        "png_filename": f"{self.output_dir}{name}_flow_line_graph_for_as_{as_queries[i]}.png",
+                        "csv_filename": f"{self.output_dir}{name}_flow_as_{as_queries[i]}.csv",
+                        "title": f"Trafic for source ASN {as_queries[i]}",
+                        "color": "src_as",
+                    })
+            
+            # Building and rendering the figures is CPU bound, so the reports are split across
+            # processes that each run their own Kaleido, at most six headless browsers at once
+            with ProcessPoolExecutor(
+                max_workers=min(len(line_reports), self.LINE_REPORT_WORKERS, os.cpu_count() or 1),
+                mp_context=get_context("spawn"),
+            ) as executor:
+                for future in as_completed([
+                    executor.submit(_save_line_report, output_dir=self.output_dir, report=report)
+                    for report in line_reports
+                ]):
+                    written, messages = future.result()
+                    for message in messages:
+                        self.log(message)
+                    if not written:
+                        rc = False
+                    report_gen_progress.update(task_id=report_gen_job_id, advance=1)
             
             if rc and genrate_peering_report:
                 self.log(f"Generating peering reports")
-                peering_report_df: pd.DataFrame = self.peering_report(df=self.raw_flow_df, topn=topn)
+                if stream_peering:
+                    peering_report_df: pd.DataFrame = self.stream_peering_report(path=self.raw_flow_file_path, topn=topn)
+                else:
+                    peering_report_df = self.peering_report(df=self.raw_flow_df, topn=topn)
                 if not self.save_peering_df_as_bubble_chart_png(
                     df=peering_report_df, 
                     filename=f"{self.output_dir}peering_report"
@@ -512,4 +925,21 @@ class Graphing:
                 report_gen_progress.update(task_id=report_gen_job_id, advance=1)
 
         return rc
-         
\ No newline at end of file
+
+
+def _save_line_report(output_dir: str, report: LineReport) -> Tuple[bool, List[str]]:
+    """Save a line report in a worker process.
+
+    The worker's log messages are collected and returned, the log
+    function itself does not pickle.
+
+    Args:
+        output_dir (str): The directory the reports are written to
+        report (LineReport): The report to save
+
+    Returns:
+        Tuple[bool, List[str]]: True if the report was saved, and the messages logged while saving it
+    """
+    messages: List[str] = []
+    graphing = Graphing(log=messages.append, output_dir=output_dir)
+    return (graphing.save_line_report(report), messages)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# rich_ui.py
+# coding=utf-8
+# Description=Rich UI pieces for the flow generator dashboard
+# UNLICENSED - Private
+# ALL RIGHTS RESERVED
+# © COPYRIGHT 2024 FERMIHDI LIMITED
+
+"""Rich UI for the Synth Netflow generator, only imported with --rich."""
+
+__copyright__ = "COPYRIGHT 2024 FERMIHDI LIMITED"
+__maintainer__ = "FermiHDI Limited"
+__credits__ = ["Craig Yamato"]
+__license__ = "UNLICENSED/NOLICENSE - Private"
+__status__ = "Development"
+__version__ = "0.0.1"
+
+from collections import deque
+from typing import (
+    Deque,
+)
+
+from rich.console import (
+    Console,
+    Group,
+    ConsoleOptions,
+    RenderResult,
+    RenderableType,
+)
+from rich.panel import Panel
+from rich.style import StyleType
+
+class LoggingWindow:
+    """An internal renderable used as a Layout logger."""
+
+    logs: Deque[RenderableType]
+
+    def __init__(self, style: StyleType = "") -> None:
+        """Rich Renderable Logging Window.
+
+        Args:
+            style (StyleType, optional): Rich style. Defaults to "".
+        """
+        self.style = style
+        self.logs = deque()
+
+    def append(self, message: RenderableType) -> None:
+        """Add new element to be rendered.
+
+        Args:
+            message (RenderableType): The Rich renderable to add
+        """
+        self.logs.append(message)
+
+    def __rich_console__(
+        self, console: Console, options: ConsoleOptions
+    ) -> RenderResult:
+        """Call by console.
+
+        Args:
+            console (Console): Rich console
+            options (ConsoleOptions): Rich console metadata
+
+        Returns:
+            RenderResult: Rich rendering info
+
+        Yields:
+            Iterator[RenderResult]: Rich rendering info
+        """
+        height = options.height or options.size.height
+        # Bounded to the panel so old logs fall off the front as new ones are appended
+        max_logs = max(height - 2, 0)
+        if self.logs.maxlen != max_logs:
+            self.logs = deque(self.logs, maxlen=max_logs)
+        yield Panel(Group(*self.logs), title="Logs", title_align="left")
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from graph import Graphing
+
+
+def test_scale_peering_rates_uses_each_sides_unit():
+    graphing = Graphing(log=print)
+    # kbps ingress and Gbps egress so the two sides get different divisors
+    df = pd.DataFrame({
+        "as": ["1", "2"],
+        "src_bps": [5e3, 1e3],
+        "src_bps_min": [1e3, 5e2],
+        "src_bps_max": [9e3, 2e3],
+        "dst_bps": [5e9, 1e9],
+        "dst_bps_min": [1e9, 5e8],
+        "dst_bps_max": [9e9, 3e9],
+    })
+    original = df.copy()
+    src_div, _ = graphing.get_unit_size(max_unit=original["src_bps"].max())
+    dst_div, _ = graphing.get_unit_size(max_unit=original["dst_bps"].max())
+    assert src_div != dst_div
+
+    src_unit, dst_unit = graphing.scale_peering_rates(df)
+
+    assert (src_unit, dst_unit) == ("kbps", "Gbps")
+    for column in ("src_bps", "src_bps_min", "src_bps_max"):
+        assert (df[column] * src_div == original[column]).all()
+    for column in ("dst_bps", "dst_bps_min", "dst_bps_max"):
+        assert (df[column] * dst_div == original[column]).all()
+
+
+def test_stream_peering_report_matches_peering_report(tmp_path):
+    rng = np.random.default_rng(3)
+    n = 500
+    first = rng.integers(1_000, 2_000, size=n, dtype=np.uint64)
+    flows = pd.DataFrame({
+        "timestamp": np.sort(rng.integers(0, 180_000, size=n, dtype=np.uint64)),
+        "srcaddr": rng.integers(0, 40, size=n, dtype=np.uint32),
+        "dstaddr": rng.integers(0, 40, size=n, dtype=np.uint32),
+        "dOctets": rng.integers(1, 1 << 20, size=n, dtype=np.uint32),
+        "first": first,
+        "last": first + rng.integers(1, 1_000, size=n, dtype=np.uint64),
+        # A third of each side outside the peer range so the masks drop some flows
+        "src_as": rng.choice(np.array([1, 2, 3, 4, 64512, 64513], dtype=np.uint16), size=n),
+        "dst_as": rng.choice(np.array([3, 4, 5, 6, 64512, 64513], dtype=np.uint16), size=n),
+    })
+    path = tmp_path / "raw_flow.csv"
+    flows.to_csv(path, index=False)
+    graphing = Graphing(log=print, output_dir=str(tmp_path))
+
+    # Enough chunks that the held peer pairs are deduped part way, and a short last chunk
+    streamed = graphing.stream_peering_report(path=str(path), topn=20, chunksize=23)
+    loaded = graphing.peering_report(df=graphing.read_flows(str(path)), topn=20)
+
+    pd.testing.assert_frame_equal(
+        streamed.drop(columns="transit"),
+        loaded.drop(columns="transit"),
+        check_exact=False,
+        rtol=1e-12,
+    )